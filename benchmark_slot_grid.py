@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+import time
+import django
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'viciniti.settings')
+django.setup()
+
+from main_app.utils.availability import BUFFER_MINUTES
+from main_app.utils.intervals import BusyIntervals
+from main_app.utils.slot_grid import grid_free_slots
+
+DURATION_MINUTES = 30
+BLOCK_HOURS = 10
+REPEATS = 3
+
+
+def loop_free_slots(duration_minutes, blocks_by_date, busy):
+    """Reference per-slot loop the grid replaced: lay out each slot, then bisect the busy periods"""
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=duration_minutes + BUFFER_MINUTES)
+
+    slots_by_date = {}
+    for date_str, blocks in blocks_by_date.items():
+        slots = []
+        for block in blocks:
+            current_start = block.start_time
+            slot_index = 0
+            while current_start + duration <= block.end_time:
+                current_end = current_start + duration
+                # Last busy period that starts before this slot ends
+                index = bisect_left(busy.starts, current_end) - 1
+                if index < 0 or busy.ends[index] <= current_start:
+                    slots.append({
+                        'id': f"slot-{date_str}-{slot_index}",
+                        'index': slot_index,
+                        'start': current_start,
+                        'end': current_end,
+                        'duration': duration_minutes
+                    })
+                slot_index += 1
+                current_start += step
+        slots_by_date[date_str] = slots
+    return slots_by_date
+
+
+def build_schedule(candidate_count):
+    """Build synthetic blocks and appointments yielding roughly candidate_count slots"""
+    slots_per_block = (BLOCK_HOURS * 60 - DURATION_MINUTES) // (DURATION_MINUTES + BUFFER_MINUTES) + 1
+    block_count = max(1, candidate_count // slots_per_block)
+
+    start_day = datetime(2030, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+    blocks_by_date = {}
+    appointments = []
+    rng = random.Random(candidate_count)
+
+    for i in range(block_count):
+        block_start = start_day + timedelta(days=i)
+        block_end = block_start + timedelta(hours=BLOCK_HOURS)
+        blocks_by_date[block_start.strftime("%Y-%m-%d")] = [
+            SimpleNamespace(start_time=block_start, end_time=block_end)
+        ]
+
+        # A handful of appointments at arbitrary minutes inside each block
+        for _ in range(3):
+            appt_start = block_start + timedelta(minutes=rng.randrange(0, BLOCK_HOURS * 60 - 60))
+            appointments.append(SimpleNamespace(start_time=appt_start, end_time=appt_start + timedelta(minutes=60)))
+
+    return blocks_by_date, BusyIntervals.from_appointments(appointments, BUFFER_MINUTES), block_count * slots_per_block
+
+
+def best_time(func):
+    """Return the best of REPEATS wall clock timings in milliseconds"""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings), result
+
+
+def run_benchmark(sizes):
+    print(f"{'candidates':>12} {'loop ms':>10} {'grid ms':>10} {'speedup':>8}  match")
+    for size in sizes:
+        blocks_by_date, busy, candidates = build_schedule(size)
+
+        loop_ms, loop_slots = best_time(
+            lambda: loop_free_slots(DURATION_MINUTES, blocks_by_date, busy)
+        )
+        grid_ms, grid_slots = best_time(
+            lambda: grid_free_slots([DURATION_MINUTES], blocks_by_date, busy, BUFFER_MINUTES)[DURATION_MINUTES]
+        )
+
+        match = loop_slots == grid_slots
+        print(f"{candidates:>12} {loop_ms:>10.1f} {grid_ms:>10.1f} {loop_ms / grid_ms:>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sizes = [int(arg) for arg in sys.argv[1:]]
+    else:
+        sizes = [1000, 10000, 100000]  # Default candidate slot counts
+
+    run_benchmark(sizes)
@@ -2,14 +2,14 @@
 import os
 import sys
 import django
-from datetime import timedelta
 
 # Set up Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'viciniti.settings')
 django.setup()
 
-from django.utils import timezone
 from main_app.models import Service, ProviderAvailability, Appointment
+from main_app.utils.availability import availability_dates, earliest_bookable_start
+from main_app.utils.slot_engine import load_provider_schedule, compute_service_slots, price_slots, slots_starting_from
 
 def check_service_availability(service_id):
     """Check availability records and simulate API response for a specific service"""
@@ -55,20 +55,21 @@ def check_service_availability(service_id):
             appt_date = appt.start_time.strftime("%Y-%m-%d")
             print(f"  {appt.id}: {appt.start_time} to {appt.end_time} (date: {appt_date})")
         
-        # Simulate API response
+        # Simulate API response with the same slot engine the availability views use
         print("\nSimulating availability calculations for the next 14 days:")
         
         # Calculate dates for the next 14 days
-        today = timezone.now().date()
         days_to_check = 14
+        dates = availability_dates(days_to_check)
         
-        for i in range(days_to_check):
-            date = today + timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            
-            # Check if this date has availability records
-            available = any(avail.day_of_week == date_str for avail in ProviderAvailability.objects.filter(provider=provider))
-            print(f"  {date_str}: {'Has availability records' if available else 'No availability records'}")
+        # Explicit blocks and weekly rules for the whole range, loaded once
+        blocks_by_date, busy = load_provider_schedule(provider, dates)
+        slots_by_date = slots_starting_from(compute_service_slots(service, blocks_by_date, busy), earliest_bookable_start())
+        
+        for date_str, slots in price_slots(service, slots_by_date):
+            # Check if this date has availability
+            available = bool(blocks_by_date[date_str])
+            print(f"  {date_str}: {'Has availability' if available else 'No availability'}, {len(slots)} free slots")
             
     except Service.DoesNotExist:
         print(f"Service with ID {service_id} not found")
@@ -324,6 +324,11 @@ const ConsumerAppointmentCalendar = ({
                 appointmentData.buffered_end = selectedSlot.buffer_info.buffered_end;
             }
             
+            // The signed quote lets the server keep the price shown without recomputing it
+            if (selectedSlot.quoteToken) {
+                appointmentData.quote_token = selectedSlot.quoteToken;
+            }
+            
             // Add discount information if available
             if (selectedSlot.discountPercentage > 0) {
                 appointmentData.original_price = selectedSlot.originalPrice;
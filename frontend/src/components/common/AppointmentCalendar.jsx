@@ -215,7 +215,9 @@ const AppointmentCalendar = forwardRef(({ mode,
                             // Add discount information if available
                             originalPrice: block.original_price,
                             discountPercentage: block.discount_percentage || 0,
-                            discountedPrice: block.discounted_price || block.original_price
+                            discountedPrice: block.discounted_price || block.original_price,
+                            // Signed price quote, sent back when booking
+                            quoteToken: block.quote_token
                         };
                     });
                 } else {
@@ -334,7 +336,8 @@ const AppointmentCalendar = forwardRef(({ mode,
                             end: block.end instanceof Date ? new Date(block.end) : new Date(block.end),
                             originalPrice: block.originalPrice,
                             discountPercentage: block.discountPercentage || 0,
-                            discountedPrice: block.discountedPrice || block.originalPrice
+                            discountedPrice: block.discountedPrice || block.originalPrice,
+                            quoteToken: block.quoteToken
                         }));
                     } else {
                         formattedBlocks[dateStr] = [];
@@ -202,6 +202,13 @@ export const availability = {
         return api.get(`/providers/${providerId}/availability/`);
     },
     
+    // Get bookable slots for all (or the given) services of a provider in one request
+    getSlotsForProvider: (providerId, serviceIds = []) => {
+        console.log('Getting slots for provider services:', providerId, serviceIds);
+        const params = serviceIds.length ? { services: serviceIds.join(',') } : {};
+        return api.get(`/providers/${providerId}/availability/slots/`, { params });
+    },
+    
     // Get availability for a specific service (which includes provider info)
     getForService: (serviceId) => {
         console.log('Getting availability for service:', serviceId);
@@ -221,6 +228,24 @@ export const availability = {
         return api.post(`/providers/${providerId}/availability/`, availabilityData);
     },
     
+    // Save only the given days of the provider's availability (a day sent as [] is cleared)
+    saveDays: (providerId, availabilityData) => {
+        console.log('Saving availability days for provider:', providerId);
+        return api.patch(`/providers/${providerId}/availability/`, availabilityData);
+    },
+    
+    // Get weekly availability rules and exception dates
+    getRecurring: (providerId) => {
+        console.log('Getting recurring availability for provider:', providerId);
+        return api.get(`/providers/${providerId}/availability/recurring/`);
+    },
+    
+    // Replace weekly availability rules and exception dates
+    saveRecurring: (providerId, recurringData) => {
+        console.log('Saving recurring availability for provider:', providerId);
+        return api.post(`/providers/${providerId}/availability/recurring/`, recurringData);
+    },
+    
     // Get provider profile
     getProviderProfile: () => {
         console.log('Getting provider profile');
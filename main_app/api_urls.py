@@ -18,7 +18,10 @@ urlpatterns = [
     path('provider/setup/', views.ProviderSetupAPI.as_view(), name='api_provider_setup'),
     path('provider/profile/', views.ProviderProfileAPI.as_view(), name='api_provider_profile'),
     path('providers/<int:provider_id>/availability/', views.ProviderAvailabilityAPI.as_view(), name='api_provider_availability'),
+    path('providers/<int:provider_id>/availability/recurring/', views.ProviderRecurringAvailabilityAPI.as_view(), name='api_provider_recurring_availability'),
+    path('providers/<int:provider_id>/availability/slots/', views.ProviderServicesAvailabilityAPI.as_view(), name='api_provider_services_availability'),
     path('provider/discount-config/', views.ProximityDiscountConfigAPI.as_view(), name='api_provider_discount_config'),
+    path('providers/<int:provider_id>/discount-tiles/<str:date>/<int:z>/<int:x>/<int:y>.<str:tile_format>', views.ProviderDiscountHeatmapAPI.as_view(), name='api_provider_discount_tiles'),
     
     # Service endpoints
     path('services/', views.ServiceListAPI.as_view(), name='api_service_list'),
@@ -28,6 +31,9 @@ urlpatterns = [
     path('services/provider/<int:provider_id>/', views.ProviderServiceListAPI.as_view(), name='api_provider_services'),
     path('services/<int:service_id>/availability/', views.ServiceAvailabilityAPI.as_view(), name='api_service_availability'),
     path('services/<int:service_id>/availability-with-discount/', views.ServiceAvailabilityWithDiscountAPI.as_view(), name='api_service_availability_with_discount'),
+    path('services/<int:service_id>/discount-quotes/', views.ServiceDiscountQuotesAPI.as_view(), name='api_service_discount_quotes'),
+    path('availability/search/', views.AvailabilitySearchAPI.as_view(), name='api_availability_search'),
+    path('availability/cache-stats/', views.AvailabilityCacheStatsAPI.as_view(), name='api_availability_cache_stats'),
     
     # Appointment endpoints - Updated to support UUID format
     path('appointments/', views.AppointmentListAPI.as_view(), name='api_appointment_list'),
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from main_app.utils.availability import AVAILABILITY_DAYS, MAX_AVAILABILITY_DAYS
+from main_app.utils.precompute import precompute_availability
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute the next days of free slots of every active service so the first '
+        'requests of the day are served warm. Meant to run nightly, e.g. from the '
+        'Heroku Scheduler: python manage.py precompute_availability --with-discounts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=AVAILABILITY_DAYS,
+            help=f'Number of days from today to precompute (default {AVAILABILITY_DAYS}, '
+                 f'the horizon the availability views show by default)'
+        )
+        parser.add_argument(
+            '--with-discounts', action='store_true',
+            help='Also precompute the base prices of the availability-with-discount view'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes (default one per CPU, 1 runs in this process)'
+        )
+        parser.add_argument(
+            '--provider', type=int, action='append', dest='provider_ids',
+            help='Only precompute this provider, may be repeated'
+        )
+        parser.add_argument(
+            '--slowest', type=int, default=10,
+            help='Number of slowest providers to list (default 10, 0 lists all)'
+        )
+
+    def handle(self, *args, **options):
+        days = min(max(options['days'], 1), MAX_AVAILABILITY_DAYS)
+
+        results = precompute_availability(
+            days=days,
+            with_discounts=options['with_discounts'],
+            workers=options['workers'],
+            provider_ids=options['provider_ids']
+        )
+
+        failed = [result for result in results if 'error' in result]
+        succeeded = [result for result in results if 'error' not in result]
+
+        listed = succeeded[:options['slowest']] if options['slowest'] else succeeded
+        for result in listed:
+            self.stdout.write(
+                f"provider {result['provider_id']} ({result['business_name']}): "
+                f"{result['seconds'] * 1000:.1f} ms, {result['services']} services, {result['slots']} slots"
+            )
+        for result in failed:
+            self.stderr.write(f"provider {result['provider_id']}: failed: {result['error']}")
+
+        total_seconds = sum(result['seconds'] for result in succeeded)
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed {days} days for {len(succeeded)} providers "
+            f"({total_seconds:.2f} s of compute), {len(failed)} failed"
+        ))
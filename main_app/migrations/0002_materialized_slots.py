@@ -0,0 +1,39 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterializedSlotDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='materialized_days', to='main_app.service')),
+            ],
+            options={
+                'unique_together': {('service', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AvailableSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slot_index', models.IntegerField()),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_slots', to='main_app.serviceprovider')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_slots', to='main_app.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['service', 'date', 'start_time'], name='main_app_slot_service_date_idx'), models.Index(fields=['provider', 'date'], name='main_app_slot_provider_day_idx')],
+            },
+        ),
+    ]
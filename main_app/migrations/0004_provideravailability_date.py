@@ -0,0 +1,34 @@
+import datetime
+
+from django.db import migrations, models
+
+
+def fill_dates(apps, schema_editor):
+    """Copy the "YYYY-MM-DD" day_of_week strings into the new date column."""
+    ProviderAvailability = apps.get_model('main_app', 'ProviderAvailability')
+
+    availabilities = list(ProviderAvailability.objects.all())
+    for avail in availabilities:
+        try:
+            avail.date = datetime.date.fromisoformat(avail.day_of_week)
+        except ValueError:
+            # Rows with a malformed day key fall back to the day the block starts on
+            avail.date = avail.start_time.date()
+
+    ProviderAvailability.objects.bulk_update(availabilities, ['date'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_serviceprovider_availability_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provideravailability',
+            name='date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_dates, migrations.RunPython.noop),
+    ]
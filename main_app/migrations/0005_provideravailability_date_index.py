@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_provideravailability_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='provideravailability',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='provideravailability',
+            index=models.Index(fields=['provider', 'date'], name='main_app_avail_prov_date_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_recurring_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusyBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bits', models.BinaryField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='busy_bitmaps', to='main_app.serviceprovider')),
+            ],
+            options={
+                'unique_together': {('provider', 'date')},
+            },
+        ),
+    ]
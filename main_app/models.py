@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.contrib.gis.db import models as gis_models
+import datetime
 import uuid
 
 class User(AbstractUser):
@@ -94,6 +95,10 @@ class ServiceProvider(models.Model):
     service_radius = models.FloatField(default=10.0)  # Default radius in miles
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Bumped whenever anything that affects this provider's availability changes
+    availability_version = models.PositiveIntegerField(default=0)
+    # Bumped only when the weekly rules or their exceptions change, keys the rule expansions
+    recurring_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.business_name
@@ -209,6 +214,13 @@ class Appointment(models.Model):
     def __str__(self):
         return f"{self.service.name} - {self.consumer.username} - {self.start_time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The times the row was loaded with, a save that moves the appointment frees their busy minutes
+        instance._loaded_span = (instance.__dict__.get('start_time'), instance.__dict__.get('end_time'))
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.end_time:
             self.end_time = self.start_time + timezone.timedelta(minutes=self.service.duration)
@@ -217,6 +229,7 @@ class Appointment(models.Model):
 class ProviderAvailability(models.Model):
     provider = models.ForeignKey('ServiceProvider', on_delete=models.CASCADE, related_name='availabilities')
     day_of_week = models.CharField(max_length=10)  # e.g., "2023-06-15" for a specific date
+    date = models.DateField()  # day_of_week as a real date, used for indexed range queries
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -224,10 +237,115 @@ class ProviderAvailability(models.Model):
 
     class Meta:
         unique_together = ('provider', 'day_of_week', 'start_time')
+        indexes = [
+            models.Index(fields=['provider', 'date'], name='main_app_avail_prov_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.provider.business_name} - {self.day_of_week} - {self.start_time.strftime('%H:%M')} to {self.end_time.strftime('%H:%M')}"
 
+    def save(self, *args, **kwargs):
+        # Keep the indexed date in sync with the day key
+        self.date = datetime.date.fromisoformat(self.day_of_week)
+        super().save(*args, **kwargs)
+
+WEEKDAY_CHOICES = (
+    (0, 'Monday'),
+    (1, 'Tuesday'),
+    (2, 'Wednesday'),
+    (3, 'Thursday'),
+    (4, 'Friday'),
+    (5, 'Saturday'),
+    (6, 'Sunday'),
+)
+
+class RecurringAvailability(models.Model):
+    """
+    A weekly availability rule, e.g. every Monday from 09:00 to 17:00.
+
+    Rules are expanded into blocks only for the dates being looked at. A date
+    with explicit ProviderAvailability rows uses those rows instead.
+    """
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='recurring_availabilities')
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)  # Monday is 0, as in date.weekday()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    timezone = models.CharField(max_length=64, default='UTC')  # IANA name the times are local to
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.provider.business_name} - {self.get_weekday_display()} - {self.start_time.strftime('%H:%M')} to {self.end_time.strftime('%H:%M')}"
+
+class AvailabilityException(models.Model):
+    """
+    A date on which the provider's weekly rules do not apply, e.g. a holiday.
+    """
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='availability_exceptions')
+    date = models.DateField()
+    reason = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('provider', 'date')
+
+    def __str__(self):
+        return f"{self.provider.business_name} - {self.date}"
+
+class MaterializedSlotDay(models.Model):
+    """
+    Marks a service-day whose free slots have been materialized into AvailableSlot.
+
+    A missing marker means the day has never been computed (or was invalidated)
+    and must be filled before its slots can be read.
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='materialized_days')
+    date = models.DateField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('service', 'date')
+
+    def __str__(self):
+        return f"{self.service.name} - {self.date}"
+
+class AvailableSlot(models.Model):
+    """
+    A precomputed free slot for a service, kept in sync with appointments and availability.
+    """
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='available_slots')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='available_slots')
+    date = models.DateField()  # The availability day the slot belongs to
+    slot_index = models.IntegerField()  # Position of the slot within its availability block
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', 'date', 'start_time'], name='main_app_slot_service_date_idx'),
+            models.Index(fields=['provider', 'date'], name='main_app_slot_provider_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service.name} - {self.start_time} to {self.end_time}"
+
+class BusyBitmap(models.Model):
+    """
+    The busy minutes of a provider's UTC day as a 1440-bit bitmap, appointment buffers included.
+
+    Rebuilt day by day when an appointment changes, see utils.busy_bitmap.
+    """
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='busy_bitmaps')
+    date = models.DateField()
+    bits = models.BinaryField()  # 180 bytes, minute m of the day is bit m
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('provider', 'date')
+
+    def __str__(self):
+        return f"{self.provider.business_name} - {self.date}"
+
 class ProximityDiscountConfig(models.Model):
     """
     Configuration for proximity-based discounts for a specific provider.
@@ -0,0 +1,72 @@
+import logging
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    Appointment, ProviderAvailability, RecurringAvailability, AvailabilityException, Service, ProximityDiscountConfig,
+    MaterializedSlotDay
+)
+from .utils.availability_cache import bump_provider_version
+from .utils.recurring import bump_recurring_version
+from .utils.slot_store import refresh_on_commit, invalidate_service
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    """Bookings change which slots are free, wherever the appointment was written from"""
+    # Fixtures are loaded as is, derived rows included
+    if kwargs.get('raw'):
+        return
+
+    provider_id = Service.objects.filter(id=instance.service_id).values_list('provider_id', flat=True).first()
+    if provider_id is None:
+        return
+
+    # The busy minutes and free slots of the days this appointment covers (or covered) are rebuilt;
+    # the covered times are the ones Appointment.from_db kept, so no query is needed to find them
+    span = (instance.start_time, instance.end_time)
+    spans = [span]
+    loaded_span = getattr(instance, '_loaded_span', None)
+    if loaded_span and all(loaded_span) and loaded_span != span:
+        spans.append(loaded_span)
+    instance._loaded_span = span
+    refresh_on_commit(provider_id, spans=spans)
+
+
+@receiver([post_save, post_delete], sender=ProviderAvailability)
+def availability_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    refresh_on_commit(instance.provider_id, dates=[instance.date])
+
+
+@receiver([post_save, post_delete], sender=RecurringAvailability)
+@receiver([post_save, post_delete], sender=AvailabilityException)
+def recurring_availability_changed(sender, instance, **kwargs):
+    """Weekly rules and their exceptions are expanded per recurring version"""
+    if kwargs.get('raw'):
+        return
+    # Any day may have changed, recompute the materialized slots on the next read,
+    # dropped before the bump so no reader caches the old slots under the new version
+    MaterializedSlotDay.objects.filter(service__provider_id=instance.provider_id).delete()
+    bump_recurring_version(instance.provider_id)
+    bump_provider_version(instance.provider_id)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def service_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # The duration may have changed, recompute the service's slots on the next read
+    invalidate_service(instance)
+    bump_provider_version(instance.provider_id)
+
+
+@receiver([post_save, post_delete], sender=ProximityDiscountConfig)
+def discount_config_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_provider_version(instance.provider_id)
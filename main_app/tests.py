@@ -0,0 +1,97 @@
+import datetime
+from datetime import timedelta
+
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import User, ServiceProvider, Service, Appointment, ProviderAvailability, ProximityDiscountConfig
+
+HORIZON_DAYS = 3
+
+
+class AvailabilityQueryCountTests(TestCase):
+    """
+    The availability endpoints read a provider's bookings in bulk, so the number
+    of queries they run must not grow with the number of appointments.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.first_date = datetime.date.today() + timedelta(days=1)
+        self.consumer = User.objects.create_user(
+            username='consumer', password='password', user_type='consumer',
+            location=Point(-73.9857, 40.7484, srid=4326)
+        )
+
+    def create_service(self, name):
+        """Create a provider with one service, a discount config and 08:00-20:00 UTC blocks over the horizon"""
+        user = User.objects.create_user(username=name, password='password', user_type='provider')
+        with self.captureOnCommitCallbacks(execute=True):
+            provider = ServiceProvider.objects.create(
+                user=user, business_name=name, business_description='Test provider'
+            )
+            ProximityDiscountConfig.objects.create(provider=provider)
+            service = Service.objects.create(
+                name=f'{name} service', description='Test service', provider=provider, price=100, duration=30
+            )
+            for offset in range(HORIZON_DAYS):
+                date = self.first_date + timedelta(days=offset)
+                day_start = datetime.datetime.combine(date, datetime.time(8), tzinfo=datetime.timezone.utc)
+                ProviderAvailability.objects.create(
+                    provider=provider,
+                    day_of_week=date.isoformat(),
+                    start_time=day_start,
+                    end_time=day_start + timedelta(hours=12)
+                )
+        return service
+
+    def book(self, service, per_day):
+        """Book per_day confirmed appointments near the consumer on every day of the horizon"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(HORIZON_DAYS):
+                date = self.first_date + timedelta(days=offset)
+                for number in range(per_day):
+                    start_time = datetime.datetime.combine(
+                        date, datetime.time(8), tzinfo=datetime.timezone.utc
+                    ) + timedelta(hours=number)
+                    Appointment.objects.create(
+                        service=service,
+                        consumer=self.consumer,
+                        start_time=start_time,
+                        end_time=start_time + timedelta(minutes=30),
+                        status='confirmed',
+                        location=Point(-73.9850, 40.7480, srid=4326)
+                    )
+
+    def availability_url(self, service, endpoint):
+        return f'/api/services/{service.id}/{endpoint}/?start={self.first_date.isoformat()}&days={HORIZON_DAYS}'
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, endpoint):
+        few = self.create_service('few')
+        self.book(few, per_day=1)
+        expected = self.count_queries(self.availability_url(few, endpoint))
+
+        many = self.create_service('many')
+        self.book(many, per_day=8)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = self.client.get(self.availability_url(many, endpoint))
+        self.assertEqual(response.status_code, 200)
+
+    def test_availability_queries_do_not_grow_with_appointments(self):
+        self.assert_constant_queries('availability')
+
+    def test_availability_with_discount_queries_do_not_grow_with_appointments(self):
+        self.client.force_authenticate(user=self.consumer)
+        self.assert_constant_queries('availability-with-discount')
@@ -0,0 +1,319 @@
+import datetime
+from datetime import timedelta
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.measure import D
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Appointment, ProviderAvailability, ServiceProvider
+from .recurring import expand_recurring
+
+# Number of days of availability shown to consumers, starting from today
+AVAILABILITY_DAYS = 14
+
+# Largest number of days a client may request in one call
+MAX_AVAILABILITY_DAYS = 60
+
+# Define a global constant for buffer time in minutes
+# This ensures consistent buffer time across all functions
+BUFFER_MINUTES = 15
+
+# Appointment statuses that take up the provider's time
+BLOCKING_STATUSES = ['pending', 'confirmed', 'completed']
+
+
+def availability_dates(days=AVAILABILITY_DAYS, start_date=None):
+    """
+    Return the list of dates in the availability horizon.
+    """
+    if start_date is None:
+        start_date = timezone.now().date()
+    return [start_date + timedelta(days=i) for i in range(days)]
+
+
+def earliest_bookable_start():
+    """
+    Return the earliest start time a slot can still be booked at (now + 1 hour).
+
+    Rounded up to a whole minute so every request within the same minute
+    sees the same slots.
+    """
+    min_start = timezone.now() + timedelta(hours=1)
+    if min_start.second or min_start.microsecond:
+        min_start = min_start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    return min_start
+
+
+def parse_horizon(params):
+    """
+    Read the requested horizon from ?start=YYYY-MM-DD&days=N query parameters.
+
+    The start defaults to today and cannot be in the past, the number of days
+    defaults to AVAILABILITY_DAYS and is capped at MAX_AVAILABILITY_DAYS.
+
+    Raises:
+        ValueError: if start is not a date or days is not a positive integer
+    """
+    today = timezone.now().date()
+
+    start = params.get('start')
+    start_date = datetime.date.fromisoformat(start) if start else today
+    start_date = max(start_date, today)
+
+    days = int(params.get('days', AVAILABILITY_DAYS))
+    if days < 1:
+        raise ValueError('days must be at least 1')
+
+    return availability_dates(min(days, MAX_AVAILABILITY_DAYS), start_date)
+
+
+def load_availability_by_date(provider, dates):
+    """
+    Load the provider's availability blocks for the given dates only.
+
+    Dates with explicit ProviderAvailability rows use them, the other dates
+    fall back to the provider's weekly rules.
+
+    Returns:
+        Dict mapping 'YYYY-MM-DD' to a list of ProviderAvailability rows or RecurringBlocks
+    """
+    blocks_by_date = {date.strftime('%Y-%m-%d'): [] for date in dates}
+    if not dates:
+        return blocks_by_date
+
+    # One range seek on the (provider, date) index
+    availabilities = ProviderAvailability.objects.filter(
+        provider=provider,
+        date__gte=min(dates),
+        date__lte=max(dates)
+    ).order_by('start_time')
+
+    for avail in availabilities:
+        date_key = avail.date.strftime('%Y-%m-%d')
+        # The range may cover days in between that were not asked for
+        if date_key in blocks_by_date:
+            blocks_by_date[date_key].append(avail)
+
+    recurring = expand_recurring({provider.id: provider.recurring_version}, dates)[provider.id]
+    for date_key, blocks in recurring.items():
+        if not blocks_by_date[date_key]:
+            blocks_by_date[date_key] = list(blocks)
+
+    return blocks_by_date
+
+
+def blocks_window(blocks_by_date, padding_minutes):
+    """
+    Return the (start, end) range covered by the blocks, widened by the padding.
+
+    Returns None when there are no blocks at all.
+    """
+    blocks = [block for day_blocks in blocks_by_date.values() for block in day_blocks]
+    if not blocks:
+        return None
+
+    padding = timedelta(minutes=padding_minutes)
+    window_start = min(block.start_time for block in blocks) - padding
+    window_end = max(block.end_time for block in blocks) + padding
+    return window_start, window_end
+
+
+def load_window_appointments(provider, statuses, window):
+    """
+    Load the times, status and location of the provider's appointments that overlap the window.
+
+    Only those columns are read, as named rows, so the cost is one query
+    whatever the number of appointments and nothing is fetched lazily later.
+
+    Args:
+        provider: ServiceProvider whose appointments to load (across all services)
+        statuses: appointment statuses to include
+        window: (start, end) datetimes, or None for an empty result
+
+    Returns:
+        Rows with start_time, end_time, status and location attributes, ordered by start
+    """
+    if window is None:
+        return Appointment.objects.none().values_list('start_time', 'end_time', 'status', 'location', named=True)
+
+    window_start, window_end = window
+    return Appointment.objects.filter(
+        service__provider=provider,
+        status__in=statuses,
+        start_time__lt=window_end,
+        end_time__gt=window_start
+    ).order_by('start_time').values_list('start_time', 'end_time', 'status', 'location', named=True)
+
+
+def load_nearby_window_appointments(provider, statuses, window, location, max_distance_yards):
+    """
+    Load the provider's appointments in the window that lie within a distance of a location.
+
+    The distance filter runs in the database (ST_DWithin on the spatial index of
+    Appointment.location) and each row carries its geography distance, so
+    nothing is measured in Python afterwards.
+
+    Args:
+        provider: ServiceProvider whose appointments to load (across all services)
+        statuses: appointment statuses to include
+        window: (start, end) datetimes, or None for an empty result
+        location: Point to measure from
+        max_distance_yards: largest distance to include
+
+    Returns:
+        Rows with start_time, end_time, status and distance (a Distance measure), ordered by start
+    """
+    if window is None or location is None:
+        return []
+
+    window_start, window_end = window
+    return Appointment.objects.filter(
+        service__provider=provider,
+        status__in=statuses,
+        start_time__lt=window_end,
+        end_time__gt=window_start,
+        location__dwithin=(location, D(yd=max_distance_yards))
+    ).annotate(
+        distance=Distance('location', location)
+    ).order_by('start_time').values_list('start_time', 'end_time', 'status', 'distance', named=True)
+
+
+def load_availability_for_providers(provider_ids, dates):
+    """
+    Load the availability blocks of several providers for the given dates in one query.
+
+    Days without explicit rows fall back to each provider's weekly rules, as in
+    load_availability_by_date.
+
+    Returns:
+        Dict mapping provider id to a dict of 'YYYY-MM-DD' -> ProviderAvailability rows or RecurringBlocks
+    """
+    date_keys = [date.strftime('%Y-%m-%d') for date in dates]
+    blocks_by_provider = {
+        provider_id: {date_key: [] for date_key in date_keys}
+        for provider_id in provider_ids
+    }
+    if not dates:
+        return blocks_by_provider
+
+    availabilities = ProviderAvailability.objects.filter(
+        provider_id__in=provider_ids,
+        date__gte=min(dates),
+        date__lte=max(dates)
+    ).order_by('start_time')
+
+    for avail in availabilities:
+        date_key = avail.date.strftime('%Y-%m-%d')
+        if date_key in blocks_by_provider[avail.provider_id]:
+            blocks_by_provider[avail.provider_id][date_key].append(avail)
+
+    provider_versions = dict(
+        ServiceProvider.objects.filter(id__in=provider_ids).values_list('id', 'recurring_version')
+    )
+    for provider_id, recurring in expand_recurring(provider_versions, dates).items():
+        for date_key, blocks in recurring.items():
+            if not blocks_by_provider[provider_id][date_key]:
+                blocks_by_provider[provider_id][date_key] = list(blocks)
+
+    return blocks_by_provider
+
+
+def load_window_appointments_for_providers(provider_ids, statuses, window):
+    """
+    Load the appointments of several providers that overlap the window in one query.
+
+    Each appointment is annotated with provider_id so callers can group them.
+    """
+    if window is None:
+        return Appointment.objects.none()
+
+    window_start, window_end = window
+    return Appointment.objects.filter(
+        service__provider_id__in=provider_ids,
+        status__in=statuses,
+        start_time__lt=window_end,
+        end_time__gt=window_start
+    ).annotate(provider_id=F('service__provider_id')).order_by('start_time')
+
+
+def save_availability_blocks(provider, submitted, replace_all=True):
+    """
+    Store submitted availability blocks with as few writes as the edit needs.
+
+    The submitted blocks are diffed against the stored ones on (day, start):
+    new blocks are bulk created, blocks whose end moved are bulk updated and
+    removed blocks are deleted with one query, all in one transaction so
+    readers never see a half-saved calendar. The materialized slots of the
+    changed days are refreshed once the transaction commits.
+
+    Args:
+        provider: ServiceProvider the blocks belong to
+        submitted: dict mapping 'YYYY-MM-DD' to a list of (start, end) aware datetimes
+        replace_all: True to replace the whole calendar (days missing from submitted
+            are cleared), False to only touch the submitted days
+
+    Returns:
+        Set of dates whose blocks changed
+    """
+    wanted = {}
+    for day_key, blocks in submitted.items():
+        for start, end in blocks:
+            wanted[(day_key, start)] = end
+
+    with transaction.atomic():
+        # Serialize saves of the same calendar
+        ServiceProvider.objects.select_for_update().filter(id=provider.id).exists()
+
+        stored = ProviderAvailability.objects.filter(provider=provider)
+        if not replace_all:
+            stored = stored.filter(date__in=[datetime.date.fromisoformat(day_key) for day_key in submitted])
+
+        now = timezone.now()
+        changed = set()
+        kept = set()
+        to_delete = []
+        to_update = []
+        for avail in stored:
+            key = (avail.day_of_week, avail.start_time)
+            if key not in wanted:
+                to_delete.append(avail.id)
+                changed.add(avail.date)
+                continue
+
+            kept.add(key)
+            if avail.end_time != wanted[key]:
+                avail.end_time = wanted[key]
+                avail.updated_at = now  # bulk_update skips auto_now
+                to_update.append(avail)
+                changed.add(avail.date)
+
+        to_create = []
+        for (day_key, start), end in wanted.items():
+            if (day_key, start) in kept:
+                continue
+            date = datetime.date.fromisoformat(day_key)
+            # bulk_create skips save(), so the date is set here
+            to_create.append(ProviderAvailability(
+                provider=provider,
+                day_of_week=day_key,
+                date=date,
+                start_time=start,
+                end_time=end
+            ))
+            changed.add(date)
+
+        if to_delete:
+            ProviderAvailability.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            ProviderAvailability.objects.bulk_update(to_update, ['end_time', 'updated_at'])
+        if to_create:
+            ProviderAvailability.objects.bulk_create(to_create)
+
+        if changed:
+            # Bulk writes do not send post_save, so refresh the changed days explicitly once committed
+            from .slot_store import refresh_on_commit
+            refresh_on_commit(provider.id, dates=changed)
+
+    return changed
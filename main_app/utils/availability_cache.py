@@ -0,0 +1,96 @@
+import logging
+
+from django.core.cache import cache
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# Entries are keyed by provider version, so they never go stale; the timeout only bounds memory
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Per-process hit/miss counters of each cache, used to size them
+_cache_stats = {
+    'availability': {'hits': 0, 'misses': 0},
+    'base_prices': {'hits': 0, 'misses': 0},
+}
+
+
+def _count_lookup(cache_name, payload):
+    _cache_stats[cache_name]['misses' if payload is None else 'hits'] += 1
+    return payload
+
+
+def bump_provider_version(provider_id):
+    """
+    Invalidate every cached availability payload of the provider.
+    """
+    from ..models import ServiceProvider
+    ServiceProvider.objects.filter(id=provider_id).update(
+        availability_version=F('availability_version') + 1
+    )
+
+
+def availability_cache_key(service_id, provider_version, date, days):
+    return f"availability:{service_id}:{provider_version}:{date.isoformat()}:{days}"
+
+
+def get_cached_availability(service_id, provider_version, date, days):
+    """
+    Return the cached availability payload, or None on a miss.
+    """
+    return _count_lookup('availability', cache.get(availability_cache_key(service_id, provider_version, date, days)))
+
+
+def set_cached_availability(service_id, provider_version, date, days, payload):
+    cache.set(
+        availability_cache_key(service_id, provider_version, date, days),
+        payload,
+        AVAILABILITY_CACHE_TIMEOUT
+    )
+
+
+def base_prices_cache_key(service_id, provider_version, date, days):
+    return f"base-prices:{service_id}:{provider_version}:{date.isoformat()}:{days}"
+
+
+def get_cached_base_prices(service_id, provider_version, date, days):
+    """
+    Return the cached base-priced slots of the availability-with-discount view, or None on a miss.
+    """
+    return _count_lookup('base_prices', cache.get(base_prices_cache_key(service_id, provider_version, date, days)))
+
+
+def set_cached_base_prices(service_id, provider_version, date, days, payload):
+    cache.set(
+        base_prices_cache_key(service_id, provider_version, date, days),
+        payload,
+        AVAILABILITY_CACHE_TIMEOUT
+    )
+
+
+def cache_payloads(payloads):
+    """
+    Store several payloads at once, e.g. the output of a precompute run.
+
+    Args:
+        payloads: dict mapping cache key to payload
+    """
+    cache.set_many(payloads, AVAILABILITY_CACHE_TIMEOUT)
+
+
+def get_cache_stats():
+    """
+    Return the hit/miss counters of this process, per cache.
+
+    Returns:
+        Dict mapping 'availability' and 'base_prices' to their 'hits', 'misses' and 'hit_rate'
+    """
+    stats = {}
+    for cache_name, counters in _cache_stats.items():
+        total = counters['hits'] + counters['misses']
+        stats[cache_name] = {
+            'hits': counters['hits'],
+            'misses': counters['misses'],
+            'hit_rate': counters['hits'] / total if total else 0.0,
+        }
+    return stats
@@ -0,0 +1,128 @@
+import logging
+from datetime import timedelta
+
+import numpy as np
+
+from .availability import load_window_appointments
+from .availability_cache import get_cached_base_prices, set_cached_base_prices
+from .discount_tiers import discount_table
+from .discounts import TIME_ADJACENCY_MINUTES, DISCOUNT_STATUSES, AdjacencyIndex, discounted_price
+from .geo_utils import haversine_matrix_meters, YARDS_PER_METER
+from .slot_engine import load_provider_schedule, compute_base_prices, slots_starting_from
+
+logger = logging.getLogger(__name__)
+
+# Largest number of consumer locations quoted in one call
+MAX_BATCH_POINTS = 1000
+
+
+def load_base_slots(service, dates, min_start=None):
+    """
+    Return a service's free slots over the dates priced without discount, in start order.
+
+    The slots come from the same per-provider-version cache as the
+    availability-with-discount view, so a warm cache costs no schedule queries.
+    """
+    provider = service.provider
+    slots_by_date = get_cached_base_prices(service.id, provider.availability_version, dates[0], len(dates))
+    if slots_by_date is None:
+        blocks_by_date, busy = load_provider_schedule(provider, dates)
+        slots_by_date = compute_base_prices(service, blocks_by_date, busy)
+        set_cached_base_prices(service.id, provider.availability_version, dates[0], len(dates), slots_by_date)
+    if min_start is not None:
+        slots_by_date = slots_starting_from(slots_by_date, min_start)
+    return [slot for date_str in sorted(slots_by_date) for slot in slots_by_date[date_str]]
+
+
+def _group_discounts(distances, columns, table):
+    """
+    Return the discount of every point for a slot whose adjacent appointments are these matrix columns.
+
+    Only appointments within the largest tier distance count, the closest one
+    decides the tier and their number the step within it.
+    """
+    adjacent = distances[:, columns]
+    within = adjacent <= table.max_distance
+    closest = np.where(within, adjacent, np.inf).min(axis=1)
+    return np.asarray(table.lookup_many(closest, within.sum(axis=1)), dtype=np.int64)
+
+
+def quote_locations(service, discount_config, locations, dates, min_start=None):
+    """
+    Find the best discounted slot of a service for each of many consumer locations.
+
+    The provider's slots and appointments are loaded once for the whole batch
+    and the distances from every location to every appointment come from one
+    vectorized haversine matrix. Slots adjacent in time to the same appointments
+    share their discounts, so each such group is priced for all locations at
+    once instead of once per slot and location.
+
+    Args:
+        service: Service to quote
+        discount_config: the provider's ProximityDiscountConfig, or None
+        locations: (latitude, longitude) pairs of the consumers
+        dates: dates to quote
+        min_start: optional earliest slot start
+
+    Returns:
+        List with, per location in order, a dict of 'slot' (the priced slot with
+        the largest discount, the earliest on ties, or None when the service has
+        no free slot) and 'discount_percentage'
+    """
+    slots = load_base_slots(service, dates, min_start)
+    if not slots:
+        return [{'slot': None, 'discount_percentage': 0} for location in locations]
+
+    best_discounts = np.zeros(len(locations), dtype=np.int64)
+    best_slots = np.zeros(len(locations), dtype=np.int64)
+
+    if discount_config and discount_config.is_active and locations:
+        adjacency = timedelta(minutes=TIME_ADJACENCY_MINUTES)
+        window = (slots[0]['start'] - adjacency, max(slot['end'] for slot in slots) + adjacency)
+        appointments = [appt for appt in load_window_appointments(service.provider, DISCOUNT_STATUSES, window) if appt.location]
+
+        if appointments:
+            table = discount_table(discount_config)
+            distances = haversine_matrix_meters(
+                [latitude for latitude, longitude in locations],
+                [longitude for latitude, longitude in locations],
+                [appt.location.y for appt in appointments],
+                [appt.location.x for appt in appointments]
+            ) * YARDS_PER_METER
+
+            # The index carries each appointment's matrix column in place of a distance
+            index = AdjacencyIndex([(appt, column) for column, appt in enumerate(appointments)])
+            group_discounts = {}
+            for position, slot in enumerate(slots):
+                columns = tuple(sorted(index.adjacent_distances(slot['start'], slot['end'])))
+                if not columns:
+                    continue
+                if columns not in group_discounts:
+                    group_discounts[columns] = _group_discounts(distances, list(columns), table)
+                discounts = group_discounts[columns]
+
+                # Slots are in start order, so only a strictly larger discount replaces the best one
+                better = discounts > best_discounts
+                best_discounts[better] = discounts[better]
+                best_slots[better] = position
+
+            logger.debug(
+                f"Quoted {len(locations)} locations against {len(appointments)} appointments "
+                f"in {len(group_discounts)} slot groups"
+            )
+
+    quotes = []
+    for discount_percentage, position in zip(best_discounts.tolist(), best_slots.tolist()):
+        slot = slots[position]
+        quotes.append({
+            'slot': dict(
+                slot,
+                discount_percentage=discount_percentage,
+                discounted_price=(
+                    discounted_price(slot['original_price'], discount_percentage)
+                    if discount_percentage > 0 else slot['original_price']
+                )
+            ),
+            'discount_percentage': discount_percentage,
+        })
+    return quotes
@@ -0,0 +1,221 @@
+import datetime
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Appointment, BusyBitmap
+from .availability import BUFFER_MINUTES, BLOCKING_STATUSES
+from .slot_grid import MINUTES_PER_DAY, to_epoch_minutes
+
+logger = logging.getLogger(__name__)
+
+# A day's bitmap is stored as 1440 bits, minute m of the (UTC) day being bit m
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def day_origin(date):
+    """
+    Return the epoch minute at which the UTC day starts.
+    """
+    return (date.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY
+
+
+def minute_date(minute):
+    """
+    Return the UTC date an epoch minute falls on.
+    """
+    return datetime.date.fromordinal(EPOCH_ORDINAL + minute // MINUTES_PER_DAY)
+
+
+def span_mask(start_minute, end_minute):
+    """
+    Return the bits of minutes [start_minute, end_minute) of a day, clamped to the day.
+    """
+    start_minute = max(start_minute, 0)
+    end_minute = min(end_minute, MINUTES_PER_DAY)
+    if end_minute <= start_minute:
+        return 0
+    return ((1 << (end_minute - start_minute)) - 1) << start_minute
+
+
+def day_masks(start, end):
+    """
+    Yield (date, mask) for every UTC day the span [start, end) covers.
+
+    Partially covered minutes count as covered.
+    """
+    start_minute = to_epoch_minutes(start)
+    end_minute = to_epoch_minutes(end, ceil=True)
+    if end_minute <= start_minute:
+        return
+
+    date = minute_date(start_minute)
+    last_date = minute_date(end_minute - 1)
+    while date <= last_date:
+        origin = day_origin(date)
+        yield date, span_mask(start_minute - origin, end_minute - origin)
+        date += timedelta(days=1)
+
+
+def build_day_bitmaps(spans, dates):
+    """
+    Build the busy bitmaps of the dates from (start, end) spans, buffer already applied.
+
+    Returns:
+        Dict mapping date to its bitmap as an int
+    """
+    bitmaps = {date: 0 for date in dates}
+    for start, end in spans:
+        for date, mask in day_masks(start, end):
+            if date in bitmaps:
+                bitmaps[date] |= mask
+    return bitmaps
+
+
+class BusyBitmaps:
+    """
+    Minute-granularity busy map of a provider over a set of UTC days.
+
+    Fitting a slot is one AND per day it touches, independent of how many
+    appointments the provider has. Days that were not loaded count as free,
+    so the loaded days must cover every span that is checked.
+    """
+
+    def __init__(self, bitmaps):
+        """
+        Args:
+            bitmaps: dict mapping date to a 1440-bit int
+        """
+        self.bitmaps = bitmaps
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def day_bytes(self, date):
+        return self.bitmaps.get(date, 0).to_bytes(BITMAP_BYTES, 'little')
+
+    def is_free(self, start, end):
+        """
+        Return True if no minute of [start, end) is busy.
+        """
+        for date, mask in day_masks(start, end):
+            if self.bitmaps.get(date, 0) & mask:
+                return False
+        return True
+
+
+def as_datetime(value):
+    """
+    Return an aware datetime for a model field that may still hold an ISO string.
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def span_dates(start, end):
+    """
+    Return the UTC dates the span [start, end) touches.
+    """
+    return [date for date, mask in day_masks(start, end)]
+
+
+def rebuild_busy_days(provider_id, dates):
+    """
+    Recompute the provider's busy bitmaps of the dates from its appointments and store them.
+
+    Returns:
+        Dict mapping date to its bitmap as an int
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    buffer = timedelta(minutes=BUFFER_MINUTES)
+    window_start = datetime.datetime.combine(dates[0], datetime.time(), tzinfo=datetime.timezone.utc) - buffer
+    window_end = datetime.datetime.combine(
+        dates[-1] + timedelta(days=1), datetime.time(), tzinfo=datetime.timezone.utc
+    ) + buffer
+
+    spans = Appointment.objects.filter(
+        service__provider_id=provider_id,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=window_end,
+        end_time__gt=window_start
+    ).values_list('start_time', 'end_time')
+
+    bitmaps = build_day_bitmaps(((start - buffer, end + buffer) for start, end in spans), dates)
+
+    BusyBitmap.objects.bulk_create(
+        [
+            BusyBitmap(provider_id=provider_id, date=date, bits=bits.to_bytes(BITMAP_BYTES, 'little'))
+            for date, bits in bitmaps.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['provider', 'date'],
+        update_fields=['bits', 'refreshed_at']
+    )
+
+    logger.debug(f"Rebuilt {len(dates)} busy bitmaps for provider {provider_id}")
+    return bitmaps
+
+
+def refresh_busy_spans(provider_id, spans):
+    """
+    Rebuild only the days an appointment change touches.
+
+    Args:
+        provider_id: id of the provider the appointment belongs to
+        spans: (start, end) of the appointment before and/or after the change
+    """
+    buffer = timedelta(minutes=BUFFER_MINUTES)
+    dates = set()
+    for start, end in spans:
+        start = as_datetime(start)
+        end = as_datetime(end)
+        if start is None or end is None:
+            continue
+        dates.update(span_dates(start - buffer, end + buffer))
+    rebuild_busy_days(provider_id, dates)
+
+
+def load_busy_bitmaps(provider_id, dates):
+    """
+    Read the provider's busy bitmaps of the dates, building the days never stored.
+
+    Returns:
+        BusyBitmaps over the dates
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return BusyBitmaps({})
+
+    stored = BusyBitmap.objects.filter(
+        provider_id=provider_id,
+        date__gte=dates[0],
+        date__lte=dates[-1]
+    ).values_list('date', 'bits')
+
+    bitmaps = {date: int.from_bytes(bytes(bits), 'little') for date, bits in stored}
+    missing = [date for date in dates if date not in bitmaps]
+    if missing:
+        bitmaps.update(rebuild_busy_days(provider_id, missing))
+
+    return BusyBitmaps(bitmaps)
+
+
+def load_window_bitmaps(provider_id, window):
+    """
+    Read the busy bitmaps of every UTC day the (start, end) window touches.
+
+    Returns empty bitmaps when window is None.
+    """
+    if window is None:
+        return BusyBitmaps({})
+    return load_busy_bitmaps(provider_id, span_dates(*window))
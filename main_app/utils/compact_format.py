@@ -0,0 +1,70 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+# Value of ?format= that asks for the columnar availability payload
+COMPACT_FORMAT = 'compact'
+
+
+class CompactFormatNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation that reads ?format=compact as a JSON payload layout.
+
+    DRF treats ?format= as a renderer override and would answer 404 for a
+    format no renderer claims, so compact requests are rendered as JSON.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if request.query_params.get(self.settings.URL_FORMAT_OVERRIDE) == COMPACT_FORMAT:
+            format_suffix = 'json'
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+def wants_compact(params):
+    """
+    Whether the client asked for the columnar payload.
+    """
+    return params.get('format') == COMPACT_FORMAT
+
+
+def compact_availability(days, origin, duration_minutes, price, buffer_minutes):
+    """
+    Build the columnar ?format=compact payload of the availability-with-discount view.
+
+    Fields that are the same for every slot are sent once, and each day has
+    parallel arrays instead of one dict per slot. A client rebuilds slot i of
+    a day as:
+
+        start = origin + starts[i] minutes, end = start + duration
+        id = "slot-<date>-<indexes[i]>"
+        discounted price = price * (1 - discounts[i] / 100), rounded to cents
+        buffered start/end = start - buffer_minutes, end + buffer_minutes
+        quote token (to send when booking) = tokens[i]
+
+    Args:
+        days: iterable of (date_str, slots), slots having 'index', 'start', 'discount_percentage'
+            and optionally 'quote_token'
+        origin: aware datetime the start offsets are counted from
+        duration_minutes: service duration
+        price: service price
+        buffer_minutes: buffer kept on both sides of an appointment
+
+    Returns:
+        Dict ready to be rendered as JSON
+    """
+    compact_days = {}
+    for date_str, slots in days:
+        compact_days[date_str] = {
+            'starts': [int((slot['start'] - origin).total_seconds() // 60) for slot in slots],
+            'indexes': [slot['index'] for slot in slots],
+            'discounts': [slot['discount_percentage'] for slot in slots],
+        }
+        if slots and 'quote_token' in slots[0]:
+            compact_days[date_str]['tokens'] = [slot['quote_token'] for slot in slots]
+
+    return {
+        'format': COMPACT_FORMAT,
+        'origin': origin.isoformat(),
+        'duration': duration_minutes,
+        'price': float(price),
+        'buffer_minutes': buffer_minutes,
+        'days': compact_days,
+    }
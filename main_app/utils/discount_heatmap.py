@@ -0,0 +1,229 @@
+import datetime
+import logging
+import math
+import struct
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+
+from ..models import Appointment
+from .availability_cache import AVAILABILITY_CACHE_TIMEOUT
+from .discount_tiers import TIER_COUNT, discount_table
+from .discounts import DISCOUNT_STATUSES
+from .geo_utils import haversine_meters, YARDS_PER_METER
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# GeoJSON tiles are traced on a coarser grid to keep the polygons few
+GEOJSON_GRID_SIZE = 64
+
+TILE_FORMATS = ('png', 'geojson')
+
+MAX_ZOOM = 22
+
+# RGBA of tiers 1-4, index 0 (no discount) is transparent
+TIER_COLORS = (
+    (0, 0, 0, 0),
+    (0, 128, 0, 170),
+    (60, 170, 60, 150),
+    (130, 200, 100, 130),
+    (200, 230, 150, 110),
+)
+
+
+def tile_bounds(z, x, y):
+    """
+    Return the (west, south, east, north) degrees of a web mercator (slippy map) tile.
+    """
+    tiles = 2 ** z
+    west = x / tiles * 360.0 - 180.0
+    east = (x + 1) / tiles * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / tiles))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / tiles))))
+    return west, south, east, north
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def pixel_centers(z, x, y, size):
+    """
+    Return (latitudes, longitudes) 2D arrays of the centers of a size x size grid over the tile.
+
+    Rows run north to south. Latitudes follow the mercator projection, so every
+    pixel covers the same on-screen area.
+    """
+    tiles = 2 ** z
+    offsets = (np.arange(size, dtype=np.float64) + 0.5) / size
+    longitudes = (x + offsets) / tiles * 360.0 - 180.0
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / tiles))))
+    return np.meshgrid(latitudes, longitudes, indexing='ij')
+
+
+def day_appointment_points(provider_id, date):
+    """
+    Return the (latitude, longitude) of the provider's appointments on a UTC day that can earn discounts.
+    """
+    day_start = datetime.datetime.combine(date, datetime.time(), tzinfo=datetime.timezone.utc)
+    locations = Appointment.objects.filter(
+        service__provider_id=provider_id,
+        status__in=DISCOUNT_STATUSES,
+        start_time__lt=day_start + timedelta(days=1),
+        end_time__gt=day_start,
+        location__isnull=False
+    ).values_list('location', flat=True)
+    return [(location.y, location.x) for location in locations]
+
+
+def tier_grid(points, table, z, x, y, size):
+    """
+    Rasterize the discount tiers over a tile as the union of tier buffers around the points.
+
+    Every pixel is measured to every point with the vectorized haversine
+    kernel; the closest point decides the tier, as it does for a booking.
+
+    Returns:
+        uint8 size x size array of tiers (0 for no discount, 1-4)
+    """
+    latitudes, longitudes = pixel_centers(z, x, y, size)
+    closest = np.full(latitudes.shape, np.inf)
+
+    west, south, east, north = tile_bounds(z, x, y)
+    for latitude, longitude in points:
+        # Points farther than the last tier from the tile cannot color it
+        nearest_latitude = min(max(latitude, south), north)
+        nearest_longitude = min(max(longitude, west), east)
+        reach = haversine_meters(latitude, longitude, [nearest_latitude], [nearest_longitude])[0] * YARDS_PER_METER
+        if reach > table.max_distance:
+            continue
+
+        distances = haversine_meters(latitude, longitude, latitudes.ravel(), longitudes.ravel()) * YARDS_PER_METER
+        np.minimum(closest, distances.reshape(closest.shape), out=closest)
+
+    tiers = np.zeros(closest.shape, dtype=np.uint8)
+    assigned = np.zeros(closest.shape, dtype=bool)
+    for tier in range(TIER_COUNT):
+        # Tiers are matched in order, as DiscountTable.tier does
+        within = ~assigned & (closest >= table.lows[tier]) & (closest <= table.highs[tier])
+        tiers[within] = tier + 1
+        assigned |= within
+    return tiers
+
+
+def encode_png(tiers):
+    """
+    Encode a tier grid as an indexed color PNG, with zlib and no imaging library.
+    """
+    height, width = tiers.shape
+
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+        )
+
+    # Each row starts with filter type 0 (none)
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), tiers]).tobytes()
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        chunk(b'PLTE', bytes(channel for color in TIER_COLORS for channel in color[:3])),
+        chunk(b'tRNS', bytes(color[3] for color in TIER_COLORS)),
+        chunk(b'IDAT', zlib.compress(rows, 9)),
+        chunk(b'IEND', b''),
+    ])
+
+
+def encode_geojson(tiers, table, z, x, y):
+    """
+    Trace a tier grid as one GeoJSON MultiPolygon feature per tier.
+
+    Runs of equal tier along a row become rectangles, so the polygons follow
+    the grid cells.
+    """
+    size = tiers.shape[0]
+    tiles = 2 ** z
+
+    def longitude(column):
+        return (x + column / size) / tiles * 360.0 - 180.0
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + row / size) / tiles))))
+
+    rectangles = {tier: [] for tier in range(1, TIER_COUNT + 1)}
+    for row in range(size):
+        values = tiers[row].tolist()
+        column = 0
+        while column < size:
+            tier = values[column]
+            run_end = column
+            while run_end < size and values[run_end] == tier:
+                run_end += 1
+            if tier:
+                west, east = longitude(column), longitude(run_end)
+                north, south = latitude(row), latitude(row + 1)
+                rectangles[tier].append([[
+                    [west, north], [east, north], [east, south], [west, south], [west, north]
+                ]])
+            column = run_end
+
+    features = []
+    for tier, polygons in rectangles.items():
+        if not polygons:
+            continue
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons},
+            'properties': {
+                'tier': tier,
+                'min_distance_yards': max(table.lows[tier - 1], 0),
+                'max_distance_yards': table.highs[tier - 1],
+                'discount_percentage': table.discounts[tier - 1][0],
+                'max_discount_percentage': table.discounts[tier - 1][-1],
+            }
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def heatmap_cache_key(provider_id, provider_version, date, z, x, y, tile_format):
+    return f"heatmap:{provider_id}:{provider_version}:{date.isoformat()}:{z}/{x}/{y}.{tile_format}"
+
+
+def discount_heatmap_tile(provider, discount_config, date, z, x, y, tile_format):
+    """
+    Return a provider-day discount heatmap tile, from the cache when possible.
+
+    Tiles are cached under the provider's availability version, which every
+    booking and discount config change bumps, so they never go stale. While
+    the config is inactive no booking earns a discount, so the tile is empty.
+
+    Args:
+        provider: ServiceProvider whose appointments are mapped
+        discount_config: the provider's ProximityDiscountConfig
+        date: UTC day of the appointments
+        z, x, y: slippy map tile coordinates
+        tile_format: 'png' (bytes) or 'geojson' (dict)
+    """
+    key = heatmap_cache_key(provider.id, provider.availability_version, date, z, x, y, tile_format)
+    tile = cache.get(key)
+    if tile is not None:
+        return tile
+
+    table = discount_table(discount_config)
+    points = day_appointment_points(provider.id, date) if discount_config.is_active else []
+
+    if tile_format == 'png':
+        tile = encode_png(tier_grid(points, table, z, x, y, TILE_SIZE))
+    else:
+        tile = encode_geojson(tier_grid(points, table, z, x, y, GEOJSON_GRID_SIZE), table, z, x, y)
+
+    cache.set(key, tile, AVAILABILITY_CACHE_TIMEOUT)
+    logger.debug(f"Rendered discount heatmap tile {z}/{x}/{y} of provider {provider.id} on {date}")
+    return tile
@@ -0,0 +1,142 @@
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIER_COUNT = 4
+
+# Nearby appointment counts above this earn the same discount
+MAX_APPOINTMENT_COUNT = 5
+
+# Compiled tables kept per process, least recently used dropped first
+MAX_CACHED_TABLES = 1024
+
+_tables = OrderedDict()
+
+
+class DiscountTable:
+    """
+    Immutable, compiled form of a ProximityDiscountConfig's tiers.
+
+    Holds the tier bounds in tier order and the 4x5 grid of discount
+    percentages (tier x nearby appointment count), so a lookup is a few
+    comparisons and an index instead of building field names for getattr.
+    Tiers are matched in order, the first one whose bounds contain the
+    distance wins, exactly as ProximityDiscountConfig.get_discount_for_distance_and_count.
+    """
+
+    __slots__ = ('lows', 'highs', 'discounts', 'max_distance', '_lows', '_highs', '_discounts')
+
+    def __init__(self, lows, highs, discounts):
+        """
+        Args:
+            lows, highs: inclusive distance bounds in yards of tiers 1-4 (tier 1 has no lower bound)
+            discounts: 4 rows of 5 discount percentages, for 1 to 5 nearby appointments
+        """
+        self.lows = tuple(lows)
+        self.highs = tuple(highs)
+        self.discounts = tuple(tuple(row) for row in discounts)
+        self.max_distance = self.highs[-1]
+
+        self._lows = np.array(self.lows, dtype=np.float64)
+        self._highs = np.array(self.highs, dtype=np.float64)
+        self._discounts = np.array(self.discounts, dtype=np.int64)
+        for array in (self._lows, self._highs, self._discounts):
+            array.setflags(write=False)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError('DiscountTable is immutable')
+        super().__setattr__(name, value)
+
+    def tier(self, distance_yards):
+        """
+        Return the 0-based tier of a distance, or None when no tier contains it.
+        """
+        for tier in range(TIER_COUNT):
+            if self.lows[tier] <= distance_yards <= self.highs[tier]:
+                return tier
+        return None
+
+    def lookup(self, distance_yards, appointment_count):
+        """
+        Return the discount percentage for the closest distance and number of nearby appointments.
+        """
+        tier = self.tier(distance_yards)
+        if tier is None:
+            return 0
+        count = min(max(appointment_count, 1), MAX_APPOINTMENT_COUNT)
+        return self.discounts[tier][count - 1]
+
+    def lookup_many(self, distances, counts):
+        """
+        Price whole arrays of (closest distance, nearby appointment count) pairs in one call.
+
+        Returns:
+            List of discount percentages, one per pair
+        """
+        distances = np.asarray(distances, dtype=np.float64)
+        if len(distances) == 0:
+            return []
+
+        within = (distances[:, None] >= self._lows) & (distances[:, None] <= self._highs)
+        tiers = np.argmax(within, axis=1)
+        counts = np.clip(np.asarray(counts, dtype=np.int64), 1, MAX_APPOINTMENT_COUNT)
+
+        discounts = np.where(within.any(axis=1), self._discounts[tiers, counts - 1], 0)
+        return discounts.tolist()
+
+
+def compile_discount_table(discount_config):
+    """
+    Compile the 7 distance thresholds and 20 discount fields of a config into a DiscountTable.
+    """
+    lows = [
+        float('-inf'),
+        discount_config.tier2_min_distance,
+        discount_config.tier3_min_distance,
+        discount_config.tier4_min_distance,
+    ]
+    highs = [
+        discount_config.tier1_distance,
+        discount_config.tier2_max_distance,
+        discount_config.tier3_max_distance,
+        discount_config.tier4_max_distance,
+    ]
+    discounts = [
+        [getattr(discount_config, f"tier{tier}_{count}appt_discount") for count in range(1, MAX_APPOINTMENT_COUNT + 1)]
+        for tier in range(1, TIER_COUNT + 1)
+    ]
+    return DiscountTable(lows, highs, discounts)
+
+
+def discount_table(discount_config):
+    """
+    Return the compiled table of a config, compiling it once per process.
+
+    Entries are keyed by the config's updated_at as well as its provider, so a
+    config saved by another process is recompiled here on its next use.
+    """
+    key = (discount_config.provider_id, discount_config.updated_at)
+    table = _tables.get(key)
+    if table is not None:
+        _tables.move_to_end(key)
+        return table
+
+    table = compile_discount_table(discount_config)
+    _tables[key] = table
+    if len(_tables) > MAX_CACHED_TABLES:
+        _tables.popitem(last=False)
+
+    logger.debug(f"Compiled discount table of provider {discount_config.provider_id}")
+    return table
+
+
+def invalidate_discount_table(provider_id):
+    """
+    Drop the compiled tables of a provider, e.g. after its config was saved.
+    """
+    for key in [key for key in _tables if key[0] == provider_id]:
+        del _tables[key]
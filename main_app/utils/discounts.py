@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from .discount_tiers import discount_table
+from .geo_utils import point_distances_yards
+
+# Appointments ending this long before a slot, or starting this long after it, count as adjacent
+TIME_ADJACENCY_MINUTES = 60
+
+# Appointment statuses that can earn a neighbour a proximity discount
+DISCOUNT_STATUSES = ['pending', 'confirmed']
+
+
+class AdjacencyIndex:
+    """
+    Index of (appointment, distance) pairs answering which are time adjacent to a slot.
+
+    The pairs are kept sorted by end time and by start time, so the adjacent
+    ones of a slot come from two bisect range lookups instead of a scan.
+    """
+
+    def __init__(self, nearby):
+        """
+        Args:
+            nearby: (appointment, distance) pairs, appointments having start_time and end_time
+        """
+        by_end = sorted(nearby, key=lambda pair: pair[0].end_time)
+        by_start = sorted(nearby, key=lambda pair: pair[0].start_time)
+        self.ends = [appt.end_time for appt, distance in by_end]
+        self.end_distances = [distance for appt, distance in by_end]
+        self.starts = [appt.start_time for appt, distance in by_start]
+        self.start_distances = [distance for appt, distance in by_start]
+
+    def __len__(self):
+        return len(self.ends)
+
+    def adjacent_distances(self, slot_start, slot_end):
+        """
+        Return the distances of the appointments adjacent in time to the slot.
+
+        Adjacent appointments end within TIME_ADJACENCY_MINUTES before the slot
+        starts, or start within it after the slot ends (bounds included).
+        """
+        threshold = timedelta(minutes=TIME_ADJACENCY_MINUTES)
+        before = self.end_distances[
+            bisect_left(self.ends, slot_start - threshold):bisect_right(self.ends, slot_start)
+        ]
+        after = self.start_distances[
+            bisect_left(self.starts, slot_end):bisect_right(self.starts, slot_end + threshold)
+        ]
+        return before + after
+
+
+class NearbyDiscountPricing:
+    """
+    Proximity discount pricing stage over appointments already known to be near the consumer.
+
+    The appointments come from availability.load_nearby_window_appointments, which
+    keeps only those within the discount config's largest tier distance and
+    measures them in the database, so a slot only needs the time adjacency lookup.
+    """
+
+    def __init__(self, nearby_appointments, discount_config):
+        """
+        Args:
+            nearby_appointments: rows with start_time, end_time, status and distance
+            discount_config: the provider's ProximityDiscountConfig, or None
+        """
+        self.discount_config = discount_config
+        self.adjacency = AdjacencyIndex([
+            (appt, appt.distance.yd) for appt in nearby_appointments if appt.status in DISCOUNT_STATUSES
+        ])
+
+    def discount_percentage(self, slot):
+        return self.discount_percentages([slot])[0]
+
+    def discount_percentages(self, slots):
+        """
+        Price a day of slots at once: the (closest distance, count) pair of every
+        slot is gathered first, then looked up in the compiled tier table in one call.
+        """
+        if not self.discount_config or not self.discount_config.is_active or not self.adjacency:
+            return [0] * len(slots)
+
+        percentages = [0] * len(slots)
+        priced = []
+        closest = []
+        counts = []
+        for position, slot in enumerate(slots):
+            nearby_distances = self.adjacency.adjacent_distances(slot['start'], slot['end'])
+            if nearby_distances:
+                priced.append(position)
+                closest.append(min(nearby_distances))
+                counts.append(len(nearby_distances))
+
+        for position, percentage in zip(priced, discount_table(self.discount_config).lookup_many(closest, counts)):
+            percentages[position] = percentage
+        return percentages
+
+
+class ProximityDiscountPricing(NearbyDiscountPricing):
+    """
+    Slot engine pricing stage applying the provider's proximity discount for a consumer.
+
+    The distances from the consumer to all of the appointments are computed
+    once, with the vectorized haversine kernel, when the stage is built.
+    """
+
+    def __init__(self, appointments, consumer_location, discount_config):
+        """
+        Args:
+            appointments: the provider's appointments around the slots (any status)
+            consumer_location: Point of the consumer, or None for no discount
+            discount_config: the provider's ProximityDiscountConfig, or None
+        """
+        self.discount_config = discount_config
+        self.adjacency = AdjacencyIndex([])
+        if not discount_config or not consumer_location:
+            return
+
+        located = [appt for appt in appointments if appt.status in DISCOUNT_STATUSES and appt.location]
+        distances = point_distances_yards(consumer_location, [appt.location for appt in located])
+        self.adjacency = AdjacencyIndex([
+            (appt, distance) for appt, distance in zip(located, distances)
+            if distance <= discount_config.tier4_max_distance
+        ])
+
+
+def discounted_price(price, discount_percentage):
+    """
+    Apply a discount percentage to a price, rounded to cents.
+    """
+    return round(float(price) * (1 - discount_percentage / 100), 2)
@@ -0,0 +1,67 @@
+import datetime
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags
+from rest_framework import status as http_status
+from rest_framework.response import Response
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the values the response depends on.
+    """
+    key = ':'.join(str(part) for part in parts)
+    return '"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def etag_matches(request, etag):
+    """
+    Return True if the request's If-None-Match header matches the ETag.
+
+    If-None-Match uses the weak comparison, so a W/ prefix is ignored.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+
+def not_modified(etag):
+    """
+    Return an empty 304 response carrying the ETag.
+    """
+    response = Response(status=http_status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    return response
+
+
+def first_slot_start(slots_by_date):
+    """
+    Return the start of the earliest slot in a date -> slots payload (None when it has none).
+
+    Slots only leave a payload from the front, as the booking cutoff passes them,
+    so the first one left stands in for the clock: it changes exactly when the
+    payload does, not every minute. Computed starts are returned in ISO format,
+    like the materialized ones of slot_store.first_materialized_starts.
+    """
+    start = min((slot['start'] for slots in slots_by_date.values() for slot in slots), default=None)
+    return start.isoformat() if isinstance(start, datetime.datetime) else start
+
+
+def catalog_version(services):
+    """
+    Return a version of a service queryset that changes whenever its listing does.
+
+    One aggregate query: the count catches removals, the latest service and
+    provider updates catch edits and additions.
+    """
+    version = services.aggregate(
+        count=Count('id'),
+        service_updated=Max('updated_at'),
+        provider_updated=Max('provider__updated_at')
+    )
+    return (version['count'], version['service_updated'], version['provider_updated'])
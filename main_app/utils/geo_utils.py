@@ -2,9 +2,17 @@ from geopy.geocoders import Nominatim
 from django.contrib.gis.geos import Point
 from django.conf import settings
 import logging
+import math
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Mean Earth radius (IUGG), the haversine distance is within 0.5% of the ellipsoidal one
+EARTH_RADIUS_METERS = 6371008.8
+
+YARDS_PER_METER = 1.0936133
+
 def geocode_address(address_line1, city, state, zip_code, country="USA"):
     """
     Geocode an address to latitude and longitude using Nominatim.
@@ -103,6 +111,105 @@ def get_location_from_address(address_components):
     
     return None
 
+def haversine_meters(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances in meters from one point to many, in one vectorized call.
+
+    Args:
+        latitude, longitude: degrees of the origin, e.g. the consumer
+        latitudes, longitudes: sequences of degrees of the other points
+
+    Returns:
+        numpy float64 array of distances in meters
+    """
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    delta_lat = lat2 - lat1
+    delta_lon = np.radians(np.asarray(longitudes, dtype=np.float64)) - math.radians(longitude)
+
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_matrix_meters(latitudes, longitudes, other_latitudes, other_longitudes):
+    """
+    Great-circle distances in meters between every pair of two sets of points, in one vectorized call.
+
+    Returns:
+        numpy float64 array of len(latitudes) x len(other_latitudes) distances
+    """
+    lat1 = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(longitudes, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(other_latitudes, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(other_longitudes, dtype=np.float64))[None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _haversine_pair(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def point_distances_meters(origin, points):
+    """
+    Distances in meters from a WGS84 Point to a list of WGS84 Points.
+
+    Returns:
+        One distance per point, in the same order
+    """
+    if not points:
+        return []
+    return haversine_meters(origin.y, origin.x, [point.y for point in points], [point.x for point in points])
+
+
+def point_distances_yards(origin, points):
+    """
+    Distances in yards from a WGS84 Point to a list of WGS84 Points, the unit discount tiers use.
+    """
+    if not points:
+        return []
+    return point_distances_meters(origin, points) * YARDS_PER_METER
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(latitude, longitude, precision=8):
+    """
+    Encode a coordinate as a geohash of the given length.
+
+    Nearby points share a prefix; 7 characters are cells of about 150 x 150 m,
+    8 characters about 38 x 19 m, 9 characters about 5 x 5 m.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Bits alternate between longitude and latitude, longitude first
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
 def distance_between_points(point1, point2):
     """
     Calculate the distance between two points in meters.
@@ -115,8 +222,8 @@ def distance_between_points(point1, point2):
         if point1.srid != point2.srid:
             point2.transform(point1.srid)
         
-        # Calculate the distance in meters
-        return point1.distance(point2) * 100000  # Approximate conversion to meters
+        # Great-circle distance, the coordinates are WGS84 degrees
+        return _haversine_pair(point1.y, point1.x, point2.y, point2.x)
     except Exception as e:
         logger.error(f"Error calculating distance: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+
+class BusyIntervals:
+    """
+    Sorted, merged set of busy periods for a single provider.
+
+    The periods are sorted and coalesced once on construction, so the slot grid
+    finds the only period a slot can overlap with one binary search.
+    """
+
+    def __init__(self, periods):
+        """
+        Args:
+            periods: iterable of (start, end) datetime pairs, in any order
+        """
+        merged = []
+        for start, end in sorted(periods):
+            if merged and start <= merged[-1][1]:
+                # Overlapping or touching the previous period, extend it
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+
+        self.starts = [period[0] for period in merged]
+        self.ends = [period[1] for period in merged]
+
+    @classmethod
+    def from_appointments(cls, appointments, buffer_minutes):
+        """
+        Build the busy set from appointments, padding each side with the buffer.
+        """
+        buffer = timedelta(minutes=buffer_minutes)
+        return cls(
+            (appointment.start_time - buffer, appointment.end_time + buffer)
+            for appointment in appointments
+        )
+
+    def __len__(self):
+        return len(self.starts)
@@ -0,0 +1,134 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections
+
+from ..models import ServiceProvider
+from .availability import AVAILABILITY_DAYS, availability_dates
+from .availability_cache import (
+    availability_cache_key, base_prices_cache_key, cache_payloads
+)
+from .slot_engine import load_provider_schedule, compute_base_prices
+from .slot_store import refresh_provider_days, read_service_slots
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """
+    Prepare a pool process to run ORM queries.
+
+    Forked processes inherit Django set up but spawned ones do not, and each
+    process opens its own database connections.
+    """
+    django.setup()
+
+
+def precompute_provider(provider_id, days=AVAILABILITY_DAYS, with_discounts=False):
+    """
+    Precompute the next days of availability of one provider.
+
+    The free slots of every active service are materialized in the slot table,
+    and the cache payloads the availability views read are built so the caller
+    can store them.
+
+    Args:
+        provider_id: id of the ServiceProvider
+        days: number of days from today to precompute
+        with_discounts: also build the base-priced slots of the availability-with-discount view
+
+    Returns:
+        Dict with 'provider_id', 'business_name', 'services', 'slots', 'seconds'
+        and 'payloads' (cache key -> payload)
+    """
+    started = time.perf_counter()
+
+    provider = ServiceProvider.objects.get(id=provider_id)
+    services = list(provider.services.filter(is_active=True))
+    dates = availability_dates(days)
+
+    refresh_provider_days(provider, dates)
+
+    payloads = {}
+    slot_count = 0
+    for service in services:
+        date_availability = read_service_slots(service, dates)
+        slot_count += sum(len(slots) for slots in date_availability.values())
+        key = availability_cache_key(service.id, provider.availability_version, dates[0], len(dates))
+        payloads[key] = date_availability
+
+    if with_discounts and services:
+        blocks_by_date, busy = load_provider_schedule(provider, dates)
+        for service in services:
+            key = base_prices_cache_key(service.id, provider.availability_version, dates[0], len(dates))
+            payloads[key] = compute_base_prices(service, blocks_by_date, busy)
+
+    return {
+        'provider_id': provider.id,
+        'business_name': provider.business_name,
+        'services': len(services),
+        'slots': slot_count,
+        'seconds': time.perf_counter() - started,
+        'payloads': payloads,
+    }
+
+
+def precompute_availability(days=AVAILABILITY_DAYS, with_discounts=False, workers=None, provider_ids=None):
+    """
+    Precompute the availability of every provider with an active service.
+
+    Providers are spread over a process pool, one task per provider, so a
+    provider's days are always computed by a single process. Slots are
+    written to the materialized slot table by the workers; the cache payloads
+    they return are stored by this process in one set_many, which warms
+    the views when the cache backend is shared with the web processes.
+
+    Args:
+        days: number of days from today to precompute
+        with_discounts: also precompute the base prices of the availability-with-discount view
+        workers: number of processes, None for one per CPU and 1 to run in this process
+        provider_ids: optional ids to restrict the run to
+
+    Returns:
+        List of per-provider results (see precompute_provider, without payloads),
+        slowest first; failed providers have 'error' instead of 'slots'
+    """
+    providers = ServiceProvider.objects.filter(services__is_active=True)
+    if provider_ids:
+        providers = providers.filter(id__in=provider_ids)
+    provider_ids = list(providers.distinct().values_list('id', flat=True))
+
+    results = []
+    payloads = {}
+
+    def collect(provider_id, run):
+        try:
+            result = run()
+        except Exception as e:
+            logger.exception(f"Precomputing availability of provider {provider_id} failed")
+            results.append({'provider_id': provider_id, 'error': str(e), 'seconds': 0.0})
+            return
+        payloads.update(result.pop('payloads'))
+        results.append(result)
+
+    if workers == 1:
+        for provider_id in provider_ids:
+            collect(provider_id, lambda: precompute_provider(provider_id, days, with_discounts))
+    else:
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            futures = {
+                executor.submit(precompute_provider, provider_id, days, with_discounts): provider_id
+                for provider_id in provider_ids
+            }
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+
+    if payloads:
+        cache_payloads(payloads)
+
+    logger.info(f"Precomputed {days} days of availability for {len(provider_ids)} providers")
+    return sorted(results, key=lambda result: result['seconds'], reverse=True)
@@ -0,0 +1,137 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .geo_utils import geohash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEOHASH_PRECISION = 8
+
+DEFAULT_CACHE_SIZE = 10000
+
+# Per-process quotes, least recently used dropped first
+_quotes = OrderedDict()
+_lock = threading.Lock()
+
+# Per-process hit/miss counters, used to tune the cell precision
+_quote_stats = {'hits': 0, 'misses': 0}
+
+
+def location_cell(location, precision=None):
+    """
+    Return the geohash cell of a consumer location, consumers in the same cell share quotes.
+
+    The precision defaults to settings.DISCOUNT_QUOTE_GEOHASH_PRECISION.
+    """
+    if precision is None:
+        precision = getattr(settings, 'DISCOUNT_QUOTE_GEOHASH_PRECISION', DEFAULT_GEOHASH_PRECISION)
+    return geohash(location.y, location.x, precision)
+
+
+def quote_key(provider_id, provider_version, date, cell):
+    return (provider_id, provider_version, date, cell)
+
+
+def get_quote(key):
+    """
+    Return the {(start, end): discount percentage} quote of a provider-day and cell, or None.
+    """
+    with _lock:
+        quote = _quotes.get(key)
+        if quote is None:
+            _quote_stats['misses'] += 1
+        else:
+            _quote_stats['hits'] += 1
+            _quotes.move_to_end(key)
+        return quote
+
+
+def set_quote(key, quote):
+    max_size = getattr(settings, 'DISCOUNT_QUOTE_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    with _lock:
+        _quotes[key] = quote
+        _quotes.move_to_end(key)
+        while len(_quotes) > max_size:
+            _quotes.popitem(last=False)
+
+
+def get_quote_stats():
+    """
+    Return the hit/miss counters and size of this process's quote cache.
+    """
+    hits = _quote_stats['hits']
+    misses = _quote_stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'size': len(_quotes),
+    }
+
+
+class CachedDiscountPricing:
+    """
+    Pricing stage answering from cached discount quotes, computing only what is missing.
+
+    A quote holds the discount percentage of every slot (start, end) of a
+    provider-day that was priced for a consumer cell, under the provider's
+    availability version, so it goes stale by itself when a booking or the
+    discount config changes the version. The inner pricing stage is only
+    built, by load_pricing, when some slot has no quote yet; consumers in the
+    same cell and repeat views skip the proximity computation entirely.
+    """
+
+    def __init__(self, provider_id, provider_version, cell, load_pricing):
+        """
+        Args:
+            provider_id: id of the provider whose slots are priced
+            provider_version: the provider's availability_version
+            cell: the consumer's geohash cell, see location_cell
+            load_pricing: callable returning the pricing stage to use on a miss
+        """
+        self.provider_id = provider_id
+        self.provider_version = provider_version
+        self.cell = cell
+        self.load_pricing = load_pricing
+        self.pricing = None
+
+    def discount_percentage(self, slot):
+        return self.discount_percentages([slot])[0]
+
+    def discount_percentages(self, slots):
+        quotes = {}
+        missing = []
+        for slot in slots:
+            date = slot['start'].date()
+            if date not in quotes:
+                quotes[date] = get_quote(quote_key(self.provider_id, self.provider_version, date, self.cell)) or {}
+            if (slot['start'], slot['end']) not in quotes[date]:
+                missing.append(slot)
+
+        if missing:
+            if self.pricing is None:
+                self.pricing = self.load_pricing()
+
+            price_day = getattr(self.pricing, 'discount_percentages', None)
+            if price_day is not None:
+                percentages = price_day(missing)
+            else:
+                percentages = [self.pricing.discount_percentage(slot) for slot in missing]
+
+            updated = set()
+            for slot, percentage in zip(missing, percentages):
+                date = slot['start'].date()
+                # Copied, the cached quote may be read by another request meanwhile
+                if date not in updated:
+                    quotes[date] = dict(quotes[date])
+                    updated.add(date)
+                quotes[date][(slot['start'], slot['end'])] = percentage
+
+            for date in updated:
+                set_quote(quote_key(self.provider_id, self.provider_version, date, self.cell), quotes[date])
+
+        return [quotes[slot['start'].date()][(slot['start'], slot['end'])] for slot in slots]
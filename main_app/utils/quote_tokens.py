@@ -0,0 +1,149 @@
+import datetime
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core import signing
+
+from .availability import load_nearby_window_appointments
+from .discounts import TIME_ADJACENCY_MINUTES, DISCOUNT_STATUSES, NearbyDiscountPricing, discounted_price
+
+logger = logging.getLogger(__name__)
+
+# Quotes issued within the same window of this many minutes share their expiry
+QUOTE_TOKEN_MINUTES = 15
+
+# How long quotes stay bookable after their window ends
+QUOTE_TOKEN_GRACE_MINUTES = 5
+
+QUOTE_TOKEN_SALT = 'main_app.quote_tokens'
+
+
+class InvalidQuoteToken(Exception):
+    """
+    The quote token was tampered with or does not match the booking.
+    """
+
+
+def quote_expiry(now=None):
+    """
+    Return the epoch second quotes issued now expire at.
+
+    The end of the current QUOTE_TOKEN_MINUTES window plus the grace period,
+    so every request in the window gets the same expiry. Responses put it in
+    their ETag: a client revalidating a cached payload is sent fresh quotes
+    once the window ends, while the ones it holds are still bookable.
+    """
+    window = QUOTE_TOKEN_MINUTES * 60
+    now = int(now if now is not None else time.time())
+    return (now // window + 1) * window + QUOTE_TOKEN_GRACE_MINUTES * 60
+
+
+def make_quote_token(service_id, provider_version, slot, expires_at, cell):
+    """
+    Sign the price quoted for a slot.
+
+    Args:
+        service_id: id of the Service the slot belongs to
+        provider_version: the provider's availability_version the price was computed under
+        slot: priced slot dict with 'start', 'original_price' and 'discount_percentage'
+        expires_at: epoch second after which the quote is recomputed, see quote_expiry
+        cell: geohash cell of the consumer the discount was computed for, None without a location
+
+    Returns:
+        URL safe token, verified by read_quote_token
+    """
+    return signing.Signer(salt=QUOTE_TOKEN_SALT).sign_object({
+        's': service_id,
+        'v': provider_version,
+        't': slot['start'].isoformat(),
+        'p': slot['original_price'],
+        'd': slot['discount_percentage'],
+        'x': expires_at,
+        'c': cell,
+    })
+
+
+def attach_quote_tokens(days, service_id, provider_version, expires_at, cell):
+    """
+    Add a 'quote_token' to every priced slot, one day at a time.
+
+    Yields:
+        ('YYYY-MM-DD', priced slots) pairs
+    """
+    for date_str, slots in days:
+        yield date_str, [
+            dict(slot, quote_token=make_quote_token(service_id, provider_version, slot, expires_at, cell))
+            for slot in slots
+        ]
+
+
+def read_quote_token(token, service_id, start, provider_version, cell, now=None):
+    """
+    Verify a quote token against the booking, in constant time.
+
+    Args:
+        cell: geohash cell of the booking consumer, None without a location
+
+    Returns:
+        Dict with 'original_price' and 'discount_percentage', or None when the
+        quote expired, was issued before the provider's data last changed or
+        was priced for a consumer elsewhere
+
+    Raises:
+        InvalidQuoteToken: bad signature, or a quote for another service or start time
+    """
+    try:
+        quote = signing.Signer(salt=QUOTE_TOKEN_SALT).unsign_object(token)
+    except (signing.BadSignature, ValueError) as e:
+        raise InvalidQuoteToken('Invalid quote token') from e
+
+    if quote['s'] != service_id or datetime.datetime.fromisoformat(quote['t']) != start:
+        raise InvalidQuoteToken('The quote token is for another slot')
+
+    if quote['x'] < (now if now is not None else time.time()) or quote['v'] != provider_version:
+        return None
+
+    # Discounts depend on where the consumer is, a quote shared with someone elsewhere is repriced
+    if quote.get('c') != cell:
+        return None
+
+    return {'original_price': quote['p'], 'discount_percentage': quote['d']}
+
+
+def reprice_slot(service, discount_config, consumer_location, start, end):
+    """
+    Compute the discount of one slot from scratch, as the availability-with-discount view does.
+
+    Returns:
+        Dict with 'original_price' and 'discount_percentage'
+    """
+    original_price = float(service.price)
+    if not discount_config or not discount_config.is_active or not consumer_location:
+        return {'original_price': original_price, 'discount_percentage': 0}
+
+    adjacency = timedelta(minutes=TIME_ADJACENCY_MINUTES)
+    nearby_appointments = list(load_nearby_window_appointments(
+        service.provider, DISCOUNT_STATUSES, (start - adjacency, end + adjacency),
+        consumer_location, discount_config.tier4_max_distance
+    ))
+    pricing = NearbyDiscountPricing(nearby_appointments, discount_config)
+    return {
+        'original_price': original_price,
+        'discount_percentage': pricing.discount_percentage({'start': start, 'end': end}),
+    }
+
+
+def booking_prices(quote):
+    """
+    Return the (original_price, discount_amount, final_price) Decimals an appointment stores for a quote.
+    """
+    original_price = quote['original_price']
+    final_price = original_price
+    if quote['discount_percentage'] > 0:
+        final_price = discounted_price(original_price, quote['discount_percentage'])
+
+    original_price = Decimal(str(original_price)).quantize(Decimal('0.01'))
+    final_price = Decimal(str(final_price)).quantize(Decimal('0.01'))
+    return original_price, original_price - final_price, final_price
@@ -0,0 +1,143 @@
+import datetime
+import logging
+from collections import namedtuple
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.core.cache import cache
+from django.db.models import F
+
+from ..models import RecurringAvailability, AvailabilityException, ServiceProvider
+
+logger = logging.getLogger(__name__)
+
+# Entries are keyed by the provider's rules version, so they never go stale; the timeout only bounds memory
+EXPANSION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# A block generated from a weekly rule, with the start_time/end_time the slot engine reads
+RecurringBlock = namedtuple('RecurringBlock', ['rule_id', 'start_time', 'end_time'])
+
+
+def week_start(date):
+    """
+    Return the Monday of the date's week.
+    """
+    return date - timedelta(days=date.weekday())
+
+
+def expansion_cache_key(provider_id, rules_version, monday):
+    return f"recurring:{provider_id}:{rules_version}:{monday.isoformat()}"
+
+
+def bump_recurring_version(provider_id):
+    """
+    Invalidate the cached rule expansions of the provider.
+
+    Only rule and exception changes bump it, so bookings and one-off blocks,
+    which bump availability_version, leave the expansions cached.
+    """
+    ServiceProvider.objects.filter(id=provider_id).update(
+        recurring_version=F('recurring_version') + 1
+    )
+
+
+def expand_week(rules, exception_dates, monday):
+    """
+    Expand weekly rules into concrete blocks for the seven days starting on monday.
+
+    Args:
+        rules: the provider's RecurringAvailability rows
+        exception_dates: set of dates on which the rules do not apply
+        monday: first day of the week
+
+    Returns:
+        Dict mapping 'YYYY-MM-DD' to RecurringBlocks ordered by start, for days that have any
+    """
+    expanded = {}
+    for offset in range(7):
+        date = monday + timedelta(days=offset)
+        if date in exception_dates:
+            continue
+
+        blocks = []
+        for rule in rules:
+            if rule.weekday != date.weekday():
+                continue
+
+            tz = ZoneInfo(rule.timezone)
+            start_time = datetime.datetime.combine(date, rule.start_time, tzinfo=tz)
+            end_time = datetime.datetime.combine(date, rule.end_time, tzinfo=tz)
+            if end_time <= start_time:
+                # The rule runs past midnight
+                end_time += timedelta(days=1)
+
+            blocks.append(RecurringBlock(rule.id, start_time, end_time))
+
+        if blocks:
+            expanded[date.strftime('%Y-%m-%d')] = sorted(blocks, key=lambda block: block.start_time)
+
+    return expanded
+
+
+def expand_recurring(provider_versions, dates):
+    """
+    Expand the weekly rules of several providers over the dates.
+
+    Each provider-week is expanded once and cached under the provider's
+    recurring version, so rule and exception changes (which bump the
+    version) are picked up on the next read.
+
+    Args:
+        provider_versions: dict mapping provider id to its recurring_version
+        dates: dates to expand
+
+    Returns:
+        Dict mapping provider id to a dict of 'YYYY-MM-DD' -> RecurringBlocks
+    """
+    if not dates or not provider_versions:
+        return {}
+
+    mondays = sorted({week_start(date) for date in dates})
+    keys = {
+        (provider_id, monday): expansion_cache_key(provider_id, version, monday)
+        for provider_id, version in provider_versions.items()
+        for monday in mondays
+    }
+
+    expansions = cache.get_many(list(keys.values()))
+    missing = [provider_week for provider_week, key in keys.items() if key not in expansions]
+
+    if missing:
+        provider_ids = {provider_id for provider_id, monday in missing}
+
+        rules_by_provider = {provider_id: [] for provider_id in provider_ids}
+        for rule in RecurringAvailability.objects.filter(provider_id__in=provider_ids):
+            rules_by_provider[rule.provider_id].append(rule)
+
+        exceptions_by_provider = {provider_id: set() for provider_id in provider_ids}
+        for provider_id, date in AvailabilityException.objects.filter(
+            provider_id__in=provider_ids,
+            date__gte=mondays[0],
+            date__lte=mondays[-1] + timedelta(days=6)
+        ).values_list('provider_id', 'date'):
+            exceptions_by_provider[provider_id].add(date)
+
+        fresh = {
+            keys[(provider_id, monday)]: expand_week(
+                rules_by_provider[provider_id], exceptions_by_provider[provider_id], monday
+            )
+            for provider_id, monday in missing
+        }
+        cache.set_many(fresh, EXPANSION_CACHE_TIMEOUT)
+        expansions.update(fresh)
+
+        logger.debug(f"Expanded {len(missing)} provider-weeks of recurring availability")
+
+    wanted = {date.strftime('%Y-%m-%d') for date in dates}
+    result = {provider_id: {} for provider_id in provider_versions}
+    for (provider_id, monday), key in keys.items():
+        for date_key, blocks in expansions[key].items():
+            if date_key in wanted:
+                result[provider_id][date_key] = blocks
+
+    return result
@@ -0,0 +1,191 @@
+from datetime import timedelta
+
+from .availability import BUFFER_MINUTES, load_availability_by_date, blocks_window
+from .busy_bitmap import load_window_bitmaps
+from .discounts import discounted_price
+from .slot_grid import grid_free_slots
+
+
+def compute_durations_slots(durations, blocks_by_date, busy):
+    """
+    Compute free slots for several service durations against one provider schedule.
+
+    Slots are laid out back-to-back inside each availability block, spaced by
+    the duration plus the buffer so each appointment has buffer time on both
+    sides, with the vectorized grid of slot_grid.grid_free_slots.
+
+    Args:
+        durations: service durations in minutes
+        blocks_by_date: dict mapping 'YYYY-MM-DD' to availability blocks
+        busy: BusyIntervals or BusyBitmaps of the provider's buffered appointments
+
+    Returns:
+        Dict mapping duration to a dict of 'YYYY-MM-DD' -> free slot dicts
+    """
+    return grid_free_slots(durations, blocks_by_date, busy, BUFFER_MINUTES)
+
+
+def serialize_slots(slots_by_date):
+    """
+    Convert computed slots to the API shape ({'id', 'start', 'end'} with ISO times).
+    """
+    return {
+        date_str: [
+            {
+                'id': slot['id'],
+                'start': slot['start'].isoformat(),
+                'end': slot['end'].isoformat()
+            }
+            for slot in slots
+        ]
+        for date_str, slots in slots_by_date.items()
+    }
+
+
+class BasePricing:
+    """
+    Pricing stage that charges the service price, without discounts.
+
+    A pricing stage is anything with a discount_percentage(slot) method, and
+    optionally discount_percentages(slots) to price a day in one call, see
+    discounts.ProximityDiscountPricing for the proximity discount stage.
+    """
+
+    def discount_percentage(self, slot):
+        return 0
+
+    def discount_percentages(self, slots):
+        return [0] * len(slots)
+
+
+def price_slots(service, slots_by_date, pricing=None):
+    """
+    Run the pricing stage over computed free slots, one day at a time.
+
+    Each slot gains 'original_price', 'discount_percentage' and 'discounted_price',
+    so a single computation serves both plain and discounted prices. Days are
+    priced lazily, a streamed response can send a day before the next is priced.
+
+    Args:
+        service: the Service the slots belong to
+        slots_by_date: dict mapping 'YYYY-MM-DD' to free slot dicts
+        pricing: pricing stage, BasePricing when omitted
+
+    Yields:
+        ('YYYY-MM-DD', priced slots) pairs
+    """
+    pricing = pricing or BasePricing()
+    original_price = float(service.price)
+
+    for date_str, slots in slots_by_date.items():
+        # Stages that can price a whole day at once do so, others are asked slot by slot
+        price_day = getattr(pricing, 'discount_percentages', None)
+        if price_day is not None:
+            percentages = price_day(slots)
+        else:
+            percentages = [pricing.discount_percentage(slot) for slot in slots]
+
+        priced = []
+        for slot, discount_percentage in zip(slots, percentages):
+            # Copied, services of the same duration share their computed slots
+            priced.append(dict(
+                slot,
+                original_price=original_price,
+                discount_percentage=discount_percentage,
+                discounted_price=(
+                    discounted_price(original_price, discount_percentage) if discount_percentage > 0 else original_price
+                )
+            ))
+        yield date_str, priced
+
+
+def serialize_priced_slot(slot, buffer_minutes=BUFFER_MINUTES):
+    """
+    Convert a priced slot to the availability-with-discount API shape.
+    """
+    buffer = timedelta(minutes=buffer_minutes)
+    serialized = {
+        'id': slot['id'],
+        'start': slot['start'].isoformat(),
+        'end': slot['end'].isoformat(),
+        'duration': slot['duration'],
+        'original_price': slot['original_price'],
+        'discount_percentage': slot['discount_percentage'],
+        'discounted_price': slot['discounted_price'],
+        # Include buffer information so the frontend knows about buffer zones
+        'buffer_info': {
+            'buffer_minutes': buffer_minutes,
+            'buffered_start': (slot['start'] - buffer).isoformat(),
+            'buffered_end': (slot['end'] + buffer).isoformat(),
+            'has_buffer': True
+        }
+    }
+    if 'quote_token' in slot:
+        # Sent back when booking so the quoted price is kept without being recomputed
+        serialized['quote_token'] = slot['quote_token']
+    return serialized
+
+
+def compute_base_prices(service, blocks_by_date, busy):
+    """
+    Compute a service's free slots priced without any discount, for every date in blocks_by_date.
+
+    This is the part of the availability-with-discount payload that does not
+    depend on the consumer, so it can be cached and precomputed; a discount
+    pricing stage re-prices the slots afterwards.
+
+    Returns:
+        Dict mapping 'YYYY-MM-DD' to the list of priced slot dicts
+    """
+    return dict(price_slots(service, compute_service_slots(service, blocks_by_date, busy)))
+
+
+def slots_starting_from(slots_by_date, min_start):
+    """
+    Return a copy of computed slots without the slots starting before min_start.
+    """
+    return {
+        date_str: [slot for slot in slots if slot['start'] >= min_start]
+        for date_str, slots in slots_by_date.items()
+    }
+
+
+def load_provider_schedule(provider, dates):
+    """
+    Load a provider's availability blocks and busy minutes for the dates once.
+
+    Busy time comes from the provider's stored busy bitmaps, so the cost does
+    not grow with the number of appointments.
+
+    Returns:
+        (blocks_by_date, busy) to be shared by every service of the provider
+    """
+    blocks_by_date = load_availability_by_date(provider, dates)
+    busy = load_window_bitmaps(provider.id, blocks_window(blocks_by_date, BUFFER_MINUTES))
+    return blocks_by_date, busy
+
+
+def compute_service_slots(service, blocks_by_date, busy):
+    """
+    Compute the free slots of one service against a loaded provider schedule.
+
+    Returns:
+        Dict mapping 'YYYY-MM-DD' to the list of free slot dicts
+    """
+    return compute_durations_slots([service.duration], blocks_by_date, busy)[service.duration]
+
+
+def compute_services_slots(provider, services, dates):
+    """
+    Compute the free slots of several services of one provider in a single pass.
+
+    The provider's schedule is loaded once and every service is laid out against it.
+
+    Returns:
+        Dict mapping service id to a dict of 'YYYY-MM-DD' -> free slot dicts
+    """
+    blocks_by_date, busy = load_provider_schedule(provider, dates)
+    slots_by_duration = compute_durations_slots(
+        [service.duration for service in services], blocks_by_date, busy
+    )
+    return {service.id: slots_by_duration[service.duration] for service in services}
@@ -0,0 +1,166 @@
+import datetime
+import math
+
+import numpy as np
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+MINUTES_PER_DAY = 1440
+
+
+def to_epoch_minutes(value, ceil=False):
+    """
+    Convert an aware datetime to whole minutes since the epoch.
+    """
+    minutes = (value - EPOCH).total_seconds() / 60
+    return math.ceil(minutes) if ceil else math.floor(minutes)
+
+
+def from_epoch_minutes(minutes):
+    """
+    Convert minutes since the epoch back to an aware UTC datetime.
+    """
+    return EPOCH + datetime.timedelta(minutes=int(minutes))
+
+
+def busy_minute_arrays(busy):
+    """
+    Convert BusyIntervals to sorted int64 start/end arrays in epoch minutes.
+
+    Starts are rounded down and ends up, so a slot never squeezes into a
+    partially busy minute.
+    """
+    starts = np.fromiter((to_epoch_minutes(start) for start in busy.starts), dtype=np.int64, count=len(busy))
+    ends = np.fromiter((to_epoch_minutes(end, ceil=True) for end in busy.ends), dtype=np.int64, count=len(busy))
+    return starts, ends
+
+
+def grid_slot_starts(block_starts, block_ends, duration, step):
+    """
+    Lay out slot starts inside every block at once.
+
+    Args:
+        block_starts, block_ends: int64 arrays of block bounds in minutes
+        duration: slot length in minutes
+        step: distance between consecutive slot starts in minutes
+
+    Returns:
+        (starts, slot_index, block_ids) arrays, one entry per candidate slot
+    """
+    lengths = block_ends - block_starts
+    counts = np.where(lengths >= duration, (lengths - duration) // step + 1, 0)
+
+    block_ids = np.repeat(np.arange(len(counts)), counts)
+    first_slot = np.cumsum(counts) - counts
+    slot_index = np.arange(int(counts.sum()), dtype=np.int64) - first_slot[block_ids]
+    starts = block_starts[block_ids] + slot_index * step
+
+    return starts, slot_index, block_ids
+
+
+def free_slot_mask(starts, duration, busy_starts, busy_ends):
+    """
+    Return a boolean mask of the slot starts that do not overlap a busy interval.
+
+    busy_starts/busy_ends must be sorted and non-overlapping, so the only
+    interval that can overlap [start, start + duration) is the last one that
+    starts before the slot ends.
+    """
+    if len(busy_starts) == 0:
+        return np.ones(len(starts), dtype=bool)
+
+    index = np.searchsorted(busy_starts, starts + duration, side='left') - 1
+    conflict = (index >= 0) & (busy_ends[np.maximum(index, 0)] > starts)
+    return ~conflict
+
+
+def bitmap_free_slot_mask(starts, duration, busy):
+    """
+    Return a boolean mask of the slot starts whose minutes are all free in the busy bitmaps.
+
+    The bitmaps of the days the slots cover are unpacked to one busy flag per
+    minute; with a running count of busy minutes, a slot fits when the count
+    does not change over its duration.
+    """
+    if len(starts) == 0 or len(busy) == 0:
+        return np.ones(len(starts), dtype=bool)
+
+    first_day = int(starts.min()) // MINUTES_PER_DAY
+    last_day = int((starts + duration).max() - 1) // MINUTES_PER_DAY
+    first_date = EPOCH.date() + datetime.timedelta(days=first_day)
+
+    minutes = np.concatenate([
+        np.unpackbits(
+            np.frombuffer(busy.day_bytes(first_date + datetime.timedelta(days=day)), dtype=np.uint8),
+            bitorder='little'
+        )
+        for day in range(last_day - first_day + 1)
+    ])
+    busy_count = np.concatenate(([0], np.cumsum(minutes, dtype=np.int64)))
+
+    offsets = starts - first_day * MINUTES_PER_DAY
+    return busy_count[offsets + duration] == busy_count[offsets]
+
+
+def grid_free_slots(durations, blocks_by_date, busy, buffer_minutes):
+    """
+    Compute free slots for several service durations over many days in one call.
+
+    Availability blocks and busy intervals are converted to int64 epoch-minute
+    arrays once, candidate starts come from a vectorized arange over every
+    block, and overlaps are tested with searchsorted (BusyIntervals) or a
+    running count of busy minutes (BusyBitmaps).
+
+    Args:
+        durations: iterable of service durations in minutes
+        blocks_by_date: dict mapping 'YYYY-MM-DD' to availability blocks
+        busy: BusyIntervals or BusyBitmaps of the provider's buffered appointments
+        buffer_minutes: spacing added between consecutive slots
+
+    Returns:
+        Dict mapping duration to a dict of 'YYYY-MM-DD' -> free slot dicts
+    """
+    date_keys = list(blocks_by_date)
+    block_dates = []
+    block_starts = []
+    block_ends = []
+    for date_number, date_str in enumerate(date_keys):
+        for block in blocks_by_date[date_str]:
+            block_dates.append(date_number)
+            block_starts.append(to_epoch_minutes(block.start_time, ceil=True))
+            block_ends.append(to_epoch_minutes(block.end_time))
+
+    block_dates = np.array(block_dates, dtype=np.int64)
+    block_starts = np.array(block_starts, dtype=np.int64)
+    block_ends = np.array(block_ends, dtype=np.int64)
+
+    use_bitmaps = hasattr(busy, 'day_bytes')
+    if not use_bitmaps:
+        busy_starts, busy_ends = busy_minute_arrays(busy)
+
+    results = {}
+    for duration in set(durations):
+        starts, slot_index, block_ids = grid_slot_starts(
+            block_starts, block_ends, duration, duration + buffer_minutes
+        )
+        if use_bitmaps:
+            free = bitmap_free_slot_mask(starts, duration, busy)
+        else:
+            free = free_slot_mask(starts, duration, busy_starts, busy_ends)
+
+        slots_by_date = {date_str: [] for date_str in date_keys}
+        for start, index, date_number in zip(
+            starts[free].tolist(), slot_index[free].tolist(), block_dates[block_ids[free]].tolist()
+        ):
+            date_str = date_keys[date_number]
+            slots_by_date[date_str].append({
+                'id': f"slot-{date_str}-{index}",
+                'index': index,
+                'start': from_epoch_minutes(start),
+                'end': from_epoch_minutes(start + duration),
+                'duration': duration
+            })
+
+        results[duration] = slots_by_date
+
+    return results
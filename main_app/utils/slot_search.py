@@ -0,0 +1,173 @@
+import heapq
+import logging
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.measure import D
+from django.db.models import Max
+
+from ..models import Service, ServiceProvider, ProximityDiscountConfig
+from .availability import (
+    BUFFER_MINUTES, BLOCKING_STATUSES, blocks_window,
+    load_availability_for_providers, load_window_appointments_for_providers
+)
+from .discounts import TIME_ADJACENCY_MINUTES, ProximityDiscountPricing
+from .intervals import BusyIntervals
+from .slot_engine import compute_durations_slots, price_slots, slots_starting_from
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_MILE = 1609.344
+
+# Hard limit on the number of results a single search may return
+MAX_SEARCH_RESULTS = 50
+
+
+def shortlist_providers(category, location):
+    """
+    Return the providers offering the category whose service radius covers the location.
+
+    The spatial index on business_location narrows the candidates to the largest
+    service radius any provider has, then each provider's own radius is applied.
+    """
+    max_radius = ServiceProvider.objects.aggregate(max_radius=Max('service_radius'))['max_radius']
+    if not max_radius:
+        return []
+
+    candidates = ServiceProvider.objects.filter(
+        business_location__dwithin=(location, D(mi=max_radius)),
+        services__category=category,
+        services__is_active=True
+    ).annotate(
+        distance=Distance('business_location', location)
+    ).distinct()
+
+    return [provider for provider in candidates if provider.distance.m <= provider.service_radius * METERS_PER_MILE]
+
+
+def search_slots(category, location, dates, min_start, max_start=None, sort='earliest', limit=10):
+    """
+    Find the earliest (or cheapest) bookable slots for a category near a location.
+
+    Every shortlisted provider's schedule, services and discount config are
+    loaded with one query each, then slots are computed per provider in memory.
+
+    Args:
+        category: service category value, e.g. 'beauty_hair'
+        location: Point of the consumer
+        dates: dates to search
+        min_start: earliest slot start
+        max_start: optional latest slot start
+        sort: 'earliest' or 'cheapest' (cheapest applies proximity discounts)
+        limit: number of results to return
+
+    Returns:
+        List of result dicts ordered by start time or discounted price
+    """
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+    providers = {provider.id: provider for provider in shortlist_providers(category, location)}
+    if not providers:
+        return []
+    provider_ids = list(providers)
+
+    services = list(Service.objects.filter(
+        provider_id__in=provider_ids,
+        category=category,
+        is_active=True
+    ))
+
+    blocks_by_provider = load_availability_for_providers(provider_ids, dates)
+
+    # One window covering every provider's blocks, wide enough for buffers and discount adjacency
+    all_blocks = {
+        (provider_id, date_key): blocks
+        for provider_id, blocks_by_date in blocks_by_provider.items()
+        for date_key, blocks in blocks_by_date.items()
+    }
+    window = blocks_window(all_blocks, max(BUFFER_MINUTES, TIME_ADJACENCY_MINUTES))
+
+    appointments_by_provider = {provider_id: [] for provider_id in provider_ids}
+    for appointment in load_window_appointments_for_providers(provider_ids, BLOCKING_STATUSES, window):
+        appointments_by_provider[appointment.provider_id].append(appointment)
+
+    discount_configs = {}
+    if sort == 'cheapest':
+        discount_configs = {
+            config.provider_id: config
+            for config in ProximityDiscountConfig.objects.filter(provider_id__in=provider_ids, is_active=True)
+        }
+
+    busy_by_provider = {
+        provider_id: BusyIntervals.from_appointments(appointments, BUFFER_MINUTES)
+        for provider_id, appointments in appointments_by_provider.items()
+    }
+
+    services_by_provider = {}
+    for service in services:
+        services_by_provider.setdefault(service.provider_id, []).append(service)
+
+    results = []
+    for provider_id, provider_services in services_by_provider.items():
+        provider = providers[provider_id]
+
+        # Every service of the provider is laid out in one engine call, from the block starts
+        # like the availability endpoints, so results keep the times those endpoints list
+        slots_by_duration = compute_durations_slots(
+            [service.duration for service in provider_services],
+            blocks_by_provider[provider_id],
+            busy_by_provider[provider_id]
+        )
+
+        pricing = None
+        if provider_id in discount_configs:
+            pricing = ProximityDiscountPricing(
+                appointments_by_provider[provider_id], location, discount_configs[provider_id]
+            )
+
+        for service in provider_services:
+            slots_by_date = slots_starting_from(slots_by_duration[service.duration], min_start)
+            if max_start is not None:
+                slots_by_date = {
+                    date_str: [slot for slot in slots if slot['start'] <= max_start]
+                    for date_str, slots in slots_by_date.items()
+                }
+
+            for date_str, slots in price_slots(service, slots_by_date, pricing):
+                for slot in slots:
+                    results.append({
+                        'start': slot['start'],
+                        'end': slot['end'],
+                        'service': service,
+                        'provider': provider,
+                        'discount_percentage': slot['discount_percentage'],
+                        'discounted_price': slot['discounted_price'],
+                    })
+
+    if sort == 'cheapest':
+        top = heapq.nsmallest(limit, results, key=lambda result: (result['discounted_price'], result['start']))
+    else:
+        top = heapq.nsmallest(limit, results, key=lambda result: result['start'])
+
+    logger.debug(f"Slot search over {len(providers)} providers found {len(results)} slots")
+
+    return [
+        {
+            'start': result['start'].isoformat(),
+            'end': result['end'].isoformat(),
+            'service': {
+                'id': result['service'].id,
+                'name': result['service'].name,
+                'duration': result['service'].duration,
+                'category': result['service'].category,
+            },
+            'provider': {
+                'id': result['provider'].id,
+                'business_name': result['provider'].business_name,
+                'distance_miles': round(result['provider'].distance.m / METERS_PER_MILE, 2),
+            },
+            'original_price': float(result['service'].price),
+            'discount_percentage': result['discount_percentage'],
+            'discounted_price': result['discounted_price'],
+        }
+        for result in top
+    ]
@@ -0,0 +1,308 @@
+import datetime
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from ..models import AvailableSlot, MaterializedSlotDay, ServiceProvider, BusyBitmap
+from .availability import BUFFER_MINUTES, load_availability_by_date
+from .availability_cache import bump_provider_version
+from .busy_bitmap import as_datetime, refresh_busy_spans
+from .slot_engine import compute_durations_slots, load_provider_schedule
+
+logger = logging.getLogger(__name__)
+
+# The refresh batch of the current thread's transaction, see refresh_on_commit
+_pending = threading.local()
+
+
+def refresh_provider_days(provider, dates):
+    """
+    Recompute and store the free slots of every active service of the provider for the given dates.
+
+    The slots of each day are replaced in a single transaction so readers never
+    see a half-written day.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return
+
+    with transaction.atomic():
+        # Serialize refreshes of the same provider so the last writer saw the latest data
+        ServiceProvider.objects.select_for_update().filter(id=provider.id).exists()
+
+        services = list(provider.services.filter(is_active=True))
+
+        blocks_by_date, busy = load_provider_schedule(provider, dates)
+
+        slots_by_duration = compute_durations_slots(
+            [service.duration for service in services], blocks_by_date, busy
+        )
+
+        slot_rows = []
+        for service in services:
+            for date_str, slots in slots_by_duration[service.duration].items():
+                date = datetime.date.fromisoformat(date_str)
+                for slot in slots:
+                    slot_rows.append(AvailableSlot(
+                        provider=provider,
+                        service=service,
+                        date=date,
+                        slot_index=slot['index'],
+                        start_time=slot['start'],
+                        end_time=slot['end']
+                    ))
+
+        AvailableSlot.objects.filter(provider=provider, date__in=dates).delete()
+        AvailableSlot.objects.bulk_create(slot_rows)
+        MaterializedSlotDay.objects.bulk_create(
+            [MaterializedSlotDay(service=service, date=date) for service in services for date in dates],
+            update_conflicts=True,
+            unique_fields=['service', 'date'],
+            update_fields=['refreshed_at']
+        )
+
+    logger.debug(f"Materialized {len(slot_rows)} slots for provider {provider.id} on {len(dates)} days")
+
+
+def dates_touching(provider, spans):
+    """
+    Return the availability days whose blocks can be affected by the given time spans.
+
+    Args:
+        provider: ServiceProvider the spans belong to
+        spans: iterable of (start, end) datetimes, e.g. appointment times
+
+    Returns:
+        Set of dates from today onwards
+    """
+    buffer = timedelta(minutes=BUFFER_MINUTES)
+    today = timezone.now().date()
+    spans = [(start - buffer, end + buffer) for start, end in spans]
+
+    # Day keys are local dates, so look one day either side of each span
+    candidates = set()
+    for start, end in spans:
+        day = start.date() - timedelta(days=1)
+        while day <= end.date() + timedelta(days=1):
+            if day >= today:
+                candidates.add(day)
+            day += timedelta(days=1)
+
+    # Blocks may be explicit rows or expanded from the weekly rules
+    dates = set()
+    for date_key, blocks in load_availability_by_date(provider, sorted(candidates)).items():
+        if any(block.start_time < end and block.end_time > start for block in blocks for start, end in spans):
+            dates.add(datetime.date.fromisoformat(date_key))
+
+    return dates
+
+
+def refresh_provider_changes(provider_id, dates=(), spans=()):
+    """
+    Bring everything derived from a provider's calendar up to date after a write.
+
+    The busy bitmaps of the appointment spans are rebuilt first, then the
+    materialized slots of the changed days and of the days the spans touch,
+    and only then is the provider's availability version bumped. A refresh
+    that fails drops what it could not rebuild, so it is recomputed on the
+    next read.
+
+    Args:
+        provider_id: id of the ServiceProvider that changed
+        dates: availability days whose blocks changed
+        spans: (start, end) of changed appointments, before and after the change
+    """
+    provider = ServiceProvider.objects.filter(id=provider_id).first()
+    if provider is None:
+        # Deleted along with the rows that changed
+        return
+
+    spans = [(as_datetime(start), as_datetime(end)) for start, end in spans]
+    spans = [(start, end) for start, end in spans if start is not None and end is not None]
+
+    if spans:
+        try:
+            refresh_busy_spans(provider_id, spans)
+        except Exception:
+            logger.exception(f"Could not refresh busy bitmaps of provider {provider_id}")
+            BusyBitmap.objects.filter(provider_id=provider_id).delete()
+
+    try:
+        today = timezone.now().date()
+        days = {date for date in dates if date >= today}
+        if spans:
+            days |= dates_touching(provider, spans)
+        refresh_provider_days(provider, days)
+    except Exception:
+        logger.exception(f"Could not refresh materialized slots of provider {provider_id}")
+        invalidate_provider(provider)
+
+    # Bumped last: a reader that sees the new version also reads the refreshed slots,
+    # one that read the old version only ever caches under that stale version
+    bump_provider_version(provider_id)
+
+
+class PendingRefreshes:
+    """
+    The provider changes of one transaction, refreshed when it commits.
+
+    Registered as the transaction's on_commit callback, so a rollback discards
+    it along with the changes it holds. Changes of a savepoint rolled back
+    inside the transaction are still refreshed, which only costs extra work.
+    """
+
+    def __init__(self):
+        self.providers = {}
+
+    def add(self, provider_id, dates, spans):
+        changes = self.providers.setdefault(provider_id, (set(), []))
+        changes[0].update(dates)
+        changes[1].extend(spans)
+
+    def __call__(self):
+        if getattr(_pending, 'batch', None) is self:
+            _pending.batch = None
+        for provider_id, (dates, spans) in self.providers.items():
+            refresh_provider_changes(provider_id, dates, spans)
+
+
+def refresh_on_commit(provider_id, dates=(), spans=()):
+    """
+    Refresh a provider's changed days once the current transaction commits, see refresh_provider_changes.
+
+    Changes made in the same transaction are merged, so a bulk edit refreshes
+    each provider once. Outside a transaction the refresh runs right away.
+    """
+    connection = transaction.get_connection()
+    batch = getattr(_pending, 'batch', None)
+    # A batch that is no longer among the connection's callbacks was run, or discarded by a rollback
+    registered = batch is not None and connection.in_atomic_block and any(
+        callback is batch for savepoint_ids, callback, robust in connection.run_on_commit
+    )
+    if not registered:
+        batch = _pending.batch = PendingRefreshes()
+
+    batch.add(provider_id, dates, spans)
+
+    if not registered:
+        transaction.on_commit(batch)
+
+
+def invalidate_service(service):
+    """
+    Drop the materialized days of a service so they are recomputed on next read.
+    """
+    MaterializedSlotDay.objects.filter(service=service).delete()
+
+
+def invalidate_provider(provider):
+    """
+    Drop the materialized days of all of the provider's services.
+    """
+    MaterializedSlotDay.objects.filter(service__provider=provider).delete()
+
+
+def drop_slots_before(date_availability, min_start):
+    """
+    Return a copy of a date -> slots payload without the slots starting before min_start.
+
+    Only the days up to min_start's date (plus one, for day keys in a timezone ahead
+    of UTC) need to be looked at, later days are kept as is.
+    """
+    cutoff_date = (min_start.date() + timedelta(days=1)).isoformat()
+    filtered = {}
+    for date_str, slots in date_availability.items():
+        if date_str <= cutoff_date:
+            slots = [
+                slot for slot in slots
+                if datetime.datetime.fromisoformat(slot['start']) >= min_start
+            ]
+        filtered[date_str] = slots
+    return filtered
+
+
+def materialize_service_days(services, dates):
+    """
+    Compute and store the days of the services' slots that have not been materialized yet.
+
+    The services must belong to the same provider, its days are refreshed together.
+    """
+    if not services:
+        return
+    materialized = set(
+        MaterializedSlotDay.objects.filter(service__in=services, date__in=dates).values_list('service_id', 'date')
+    )
+    missing = [
+        date for date in dates
+        if any((service.id, date) not in materialized for service in services)
+    ]
+    if missing:
+        refresh_provider_days(services[0].provider, missing)
+
+
+def first_materialized_starts(services, dates, min_start):
+    """
+    Return the ISO start of each service's first materialized slot from min_start on.
+
+    One aggregate query, so a response can be versioned before any slot of
+    it is read or computed.
+
+    Returns:
+        Dict mapping service id to the ISO start, or None when the service has no slot left
+    """
+    materialize_service_days(services, dates)
+    starts = {service.id: None for service in services}
+    for service_id, start_time in AvailableSlot.objects.filter(
+        service__in=services,
+        date__gte=dates[0],
+        date__lte=dates[-1],
+        start_time__gte=min_start
+    ).values('service_id').annotate(first_start=Min('start_time')).values_list('service_id', 'first_start'):
+        starts[service_id] = start_time.isoformat()
+    return starts
+
+
+def first_materialized_start(service, dates, min_start):
+    """
+    Return the ISO start of a service's first materialized slot from min_start on, or None.
+    """
+    return first_materialized_starts([service], dates, min_start)[service.id]
+
+
+def read_service_slots(service, dates, min_start=None):
+    """
+    Read a service's materialized free slots for the given dates.
+
+    Days that have not been materialized yet are computed first, after that the
+    read is one range query on the (service, date, start_time) index.
+
+    Returns:
+        Dict mapping 'YYYY-MM-DD' to a list of {'id', 'start', 'end'} dicts
+    """
+    materialize_service_days([service], dates)
+
+    date_availability = {date.strftime('%Y-%m-%d'): [] for date in dates}
+
+    slots = AvailableSlot.objects.filter(
+        service=service,
+        date__gte=dates[0],
+        date__lte=dates[-1]
+    )
+    if min_start is not None:
+        slots = slots.filter(start_time__gte=min_start)
+
+    for date, slot_index, start_time, end_time in slots.order_by('date', 'start_time').values_list(
+        'date', 'slot_index', 'start_time', 'end_time'
+    ):
+        date_str = date.strftime('%Y-%m-%d')
+        date_availability[date_str].append({
+            'id': f"slot-{date_str}-{slot_index}",
+            'start': start_time.isoformat(),
+            'end': end_time.isoformat()
+        })
+
+    return date_availability
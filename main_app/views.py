@@ -7,6 +7,7 @@ from django.utils import timezone
 from django.db.models import Q
 from django.utils.dateparse import parse_datetime
 from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse, HttpResponse
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 import json
@@ -24,22 +25,73 @@ from django.views.generic import ListView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.authtoken.models import Token
 from rest_framework import status as http_status
 from rest_framework.permissions import BasePermission
 
 from django.views.generic.list import ListView
-from .models import User, ServiceProvider, Service, Appointment, ProviderAvailability
+from .models import User, ServiceProvider, Service, Appointment, ProviderAvailability, ProximityDiscountConfig
 from .forms import UserRegistrationForm, ServiceProviderForm, ServiceForm, AppointmentForm
-
-# Define a global constant for buffer time in minutes
-# This ensures consistent buffer time across all functions
-BUFFER_MINUTES = 15
+from .utils.slot_engine import (
+    compute_services_slots, price_slots, serialize_slots, serialize_priced_slot,
+    load_provider_schedule, compute_base_prices, slots_starting_from
+)
+from .utils.slot_search import search_slots
+from .utils.discounts import TIME_ADJACENCY_MINUTES, DISCOUNT_STATUSES, NearbyDiscountPricing
+from .utils.discount_tiers import invalidate_discount_table
+from .utils.batch_quotes import MAX_BATCH_POINTS, quote_locations
+from .utils.discount_heatmap import TILE_FORMATS, valid_tile, discount_heatmap_tile
+from .utils.quote_cache import CachedDiscountPricing, location_cell, get_quote_stats
+from .utils.quote_tokens import (
+    InvalidQuoteToken, attach_quote_tokens, quote_expiry, read_quote_token, reprice_slot, booking_prices
+)
+from .utils.availability_cache import (
+    get_cached_availability, set_cached_availability, get_cached_base_prices, set_cached_base_prices,
+    bump_provider_version, get_cache_stats
+)
+from .utils.recurring import expand_recurring, bump_recurring_version
+from .utils.compact_format import CompactFormatNegotiation, wants_compact, compact_availability
+from .utils.etags import make_etag, etag_matches, not_modified, first_slot_start, catalog_version
+from .utils.slot_store import (
+    read_service_slots, first_materialized_start, first_materialized_starts, drop_slots_before, invalidate_provider
+)
+from .utils.busy_bitmap import load_busy_bitmaps, span_dates
+from .utils.availability import (
+    AVAILABILITY_DAYS, BUFFER_MINUTES, BLOCKING_STATUSES, availability_dates, parse_horizon, earliest_bookable_start,
+    load_nearby_window_appointments, save_availability_blocks
+)
 
 # For parsing ISO format datetimes
 from dateutil.parser import parse as parse_datetime
 
+def stream_days(days):
+    """
+    Stream (date, slots) pairs as NDJSON, one line per day, as they are computed.
+
+    The 200 status is sent with the first line, so an error raised while a later
+    day is computed ends the stream with an {"error": ...} line instead of
+    silently truncating it.
+    """
+    def lines():
+        try:
+            for date_str, slots in days:
+                yield json.dumps({'date': date_str, 'slots': slots}, cls=DjangoJSONEncoder) + '\n'
+        except Exception as e:
+            import traceback
+            print(f"DEBUG AVAILABILITY ERROR: Streaming stopped: {str(e)}")
+            traceback.print_exc()
+            yield json.dumps({'error': str(e)}) + '\n'
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+def wants_stream(request):
+    """Whether the client asked for a day-by-day streamed response"""
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'ndjson')
+
+def can_map_discounts(user, provider):
+    """Whether the user may see where the provider's discounts are, which reveals where its bookings are"""
+    return provider.user_id == user.id
+
 # Define the home view
 class Home(APIView):
   def get(self, request):
@@ -414,6 +466,11 @@ class ServiceListAPI(APIView):
             from .models import Service
             services = Service.objects.filter(is_active=True)
             
+            # Answer re-polls with 304 while nothing in the catalog changed
+            etag = make_etag('services', *catalog_version(services))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
             # Convert services to a list of dictionaries
             service_list = []
             for service in services:
@@ -431,7 +488,9 @@ class ServiceListAPI(APIView):
                     }
                 })
             
-            return Response(service_list)
+            response = Response(service_list)
+            response['ETag'] = etag
+            return response
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -995,7 +1054,7 @@ class ProviderAvailabilityAPI(APIView):
             provider = ServiceProvider.objects.get(id=provider_id)
             
             # Get availabilities
-            availabilities = ProviderAvailability.objects.filter(provider=provider)
+            availabilities = ProviderAvailability.objects.filter(provider=provider).order_by('date', 'start_time')
             
             # Organize by day
             availability_data = {}
@@ -1010,6 +1069,28 @@ class ProviderAvailabilityAPI(APIView):
                     'end': avail.end_time.isoformat()
                 })
             
+            # Days without explicit blocks come from the weekly rules, expanded for the requested horizon
+            try:
+                dates = parse_horizon(request.query_params)
+            except ValueError:
+                return Response({
+                    'error': 'start must be a YYYY-MM-DD date and days a positive number'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            
+            recurring = expand_recurring({provider.id: provider.recurring_version}, dates)[provider.id]
+            for day_key, blocks in recurring.items():
+                if day_key in availability_data:
+                    continue
+                availability_data[day_key] = [
+                    {
+                        'id': f"recurring-{block.rule_id}",
+                        'start': block.start_time.isoformat(),
+                        'end': block.end_time.isoformat(),
+                        'recurring': True
+                    }
+                    for block in blocks
+                ]
+            
             return Response(availability_data)
         except ServiceProvider.DoesNotExist:
             return Response({
@@ -1021,9 +1102,17 @@ class ProviderAvailabilityAPI(APIView):
             }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     def post(self, request, provider_id):
-        """Save availability for a specific provider"""
+        """Save availability for a specific provider, replacing the whole calendar"""
+        return self.save_availability(request, provider_id, replace_all=True)
+    
+    def patch(self, request, provider_id):
+        """Save availability for the submitted days only, a day sent as [] is cleared"""
+        return self.save_availability(request, provider_id, replace_all=False)
+    
+    def save_availability(self, request, provider_id, replace_all):
+        """Diff the submitted blocks against the stored ones and write only the changes"""
         try:
-            from .models import ServiceProvider, ProviderAvailability
+            from .models import ServiceProvider
             
             # Check if user is authenticated
             if not request.user.is_authenticated:
@@ -1042,213 +1131,399 @@ class ProviderAvailabilityAPI(APIView):
             # Get availability data
             availability_data = request.data
             
-            # Delete existing availability
-            ProviderAvailability.objects.filter(provider=provider).delete()
+            # Day keys are stored as real dates, e.g. "2025-06-15", block times as aware datetimes
+            try:
+                submitted_blocks = {}
+                for day_key, blocks in availability_data.items():
+                    datetime.date.fromisoformat(day_key)
+                    submitted_blocks[day_key] = []
+                    for block in blocks:
+                        start = parse_datetime(block['start'])
+                        end = parse_datetime(block['end'])
+                        if timezone.is_naive(start):
+                            start = timezone.make_aware(start)
+                        if timezone.is_naive(end):
+                            end = timezone.make_aware(end)
+                        submitted_blocks[day_key].append((start, end))
+            except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+                return Response({
+                    'error': 'Availability days must be YYYY-MM-DD dates with blocks that have a start and an end'
+                }, http_status.HTTP_400_BAD_REQUEST)
             
-            # Create new availability blocks
-            for day_key, blocks in availability_data.items():
-                for block in blocks:
-                    ProviderAvailability.objects.create(
+            # One transaction with bulk writes sized by the edit, not by the calendar,
+            # the materialized slots of the changed days are refreshed as it commits
+            changed_dates = save_availability_blocks(provider, submitted_blocks, replace_all)
+            print(f"DEBUG AVAILABILITY: Saved availability, {len(changed_dates)} days changed")
+            
+            return Response(availability_data)
+        except Exception as e:
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProviderRecurringAvailabilityAPI(APIView):
+    def get(self, request, provider_id):
+        """Get the weekly availability rules and exception dates of a provider"""
+        try:
+            from .models import ServiceProvider
+            provider = ServiceProvider.objects.get(id=provider_id)
+            
+            return Response({
+                'rules': [
+                    {
+                        'id': rule.id,
+                        'weekday': rule.weekday,
+                        'start': rule.start_time.strftime('%H:%M'),
+                        'end': rule.end_time.strftime('%H:%M'),
+                        'timezone': rule.timezone
+                    }
+                    for rule in provider.recurring_availabilities.order_by('weekday', 'start_time')
+                ],
+                'exceptions': [
+                    {
+                        'date': exception.date.isoformat(),
+                        'reason': exception.reason
+                    }
+                    for exception in provider.availability_exceptions.order_by('date')
+                ]
+            })
+        except ServiceProvider.DoesNotExist:
+            return Response({
+                'error': 'Provider not found'
+            }, http_status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def post(self, request, provider_id):
+        """
+        Replace the weekly availability rules and exception dates of a provider.
+        
+        Expected body:
+            {
+                "timezone": "America/New_York",
+                "rules": [{"weekday": 0, "start": "09:00", "end": "17:00"}, ...],
+                "exceptions": [{"date": "2025-07-04", "reason": "Holiday"}, ...]
+            }
+        """
+        try:
+            from .models import ServiceProvider, RecurringAvailability, AvailabilityException
+            from django.db import transaction
+            from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+            
+            # Check if user is authenticated
+            if not request.user.is_authenticated:
+                return Response({
+                    'error': 'Authentication required'
+                }, http_status.HTTP_401_UNAUTHORIZED)
+            
+            # Check if provider exists and belongs to this user
+            try:
+                provider = ServiceProvider.objects.get(id=provider_id, user=request.user)
+            except ServiceProvider.DoesNotExist:
+                return Response({
+                    'error': 'You do not have permission to update this provider\'s availability'
+                }, http_status.HTTP_403_FORBIDDEN)
+            
+            tz_name = request.data.get('timezone') or 'UTC'
+            try:
+                ZoneInfo(tz_name)
+            except (ZoneInfoNotFoundError, ValueError):
+                return Response({
+                    'error': f'Unknown timezone: {tz_name}'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            
+            # Validate everything before replacing the stored rules
+            try:
+                rules = []
+                for rule in request.data.get('rules', []):
+                    weekday = int(rule['weekday'])
+                    start_time = datetime.time.fromisoformat(rule['start'])
+                    end_time = datetime.time.fromisoformat(rule['end'])
+                    if not 0 <= weekday <= 6 or start_time == end_time:
+                        raise ValueError('invalid rule')
+                    rules.append(RecurringAvailability(
                         provider=provider,
-                        day_of_week=day_key,
-                        start_time=block['start'],
-                        end_time=block['end']
+                        weekday=weekday,
+                        start_time=start_time,
+                        end_time=end_time,
+                        timezone=tz_name
+                    ))
+                
+                exceptions = {}
+                for exception in request.data.get('exceptions', []):
+                    exception_date = datetime.date.fromisoformat(exception['date'])
+                    exceptions[exception_date] = AvailabilityException(
+                        provider=provider,
+                        date=exception_date,
+                        reason=exception.get('reason', '')[:100]
                     )
+            except (KeyError, TypeError, ValueError):
+                return Response({
+                    'error': 'Rules need a weekday (0-6) and distinct HH:MM start and end, exceptions a YYYY-MM-DD date'
+                }, http_status.HTTP_400_BAD_REQUEST)
             
-            return Response(availability_data)
+            with transaction.atomic():
+                RecurringAvailability.objects.filter(provider=provider).delete()
+                AvailabilityException.objects.filter(provider=provider).delete()
+                RecurringAvailability.objects.bulk_create(rules)
+                AvailabilityException.objects.bulk_create(exceptions.values())
+                # bulk_create does not send post_save: any day may have changed, so drop the
+                # materialized slots and the rule expansions, then bump the version
+                invalidate_provider(provider)
+                bump_recurring_version(provider.id)
+                bump_provider_version(provider.id)
+            
+            print(f"DEBUG AVAILABILITY: Saved {len(rules)} weekly rules and {len(exceptions)} exceptions for provider {provider.id}")
+            
+            return self.get(request, provider_id)
         except Exception as e:
             return Response({
                 'error': str(e)
             }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class ServiceAvailabilityAPI(APIView):
+class ProviderServicesAvailabilityAPI(APIView):
     permission_classes = [AllowAny]  # Allow anyone to view availability
 
-    def get(self, request, service_id):
-        """Get availability for a specific service with accurate conflict detection"""
+    def get(self, request, provider_id):
+        """Get availability for all (or selected) services of a provider in one request"""
         try:
-            # Add debug logging
-            print(f"DEBUG AVAILABILITY: Calculating availability for service {service_id}")
+            from .models import ServiceProvider
+            provider = ServiceProvider.objects.get(id=provider_id)
             
-            from .models import Service, ProviderAvailability, Appointment
-            # Check if service exists
-            service = Service.objects.get(id=service_id)
+            services = provider.services.filter(is_active=True).order_by('id')
             
-            # Get provider associated with this service
-            provider = service.provider
-            print(f"DEBUG AVAILABILITY: Found provider: {provider.business_name}")
+            try:
+                dates = parse_horizon(request.query_params)
+            except ValueError:
+                return Response({
+                    'error': 'start must be a YYYY-MM-DD date and days a positive number'
+                }, http_status.HTTP_400_BAD_REQUEST)
             
-            # Get existing appointments for this provider (not just this service)
-            # This ensures we account for all provider commitments
-            existing_appointments = Appointment.objects.filter(
-                service__provider=provider,  # All provider appointments
-                status__in=['pending', 'confirmed', 'completed']  # Only active appointments
-            )
+            # Optional comma separated list of service ids, e.g. ?services=3,5
+            service_ids = request.query_params.get('services')
+            if service_ids:
+                try:
+                    service_ids = [int(service_id) for service_id in service_ids.split(',') if service_id.strip()]
+                except ValueError:
+                    return Response({
+                        'error': 'services must be a comma separated list of service ids'
+                    }, http_status.HTTP_400_BAD_REQUEST)
+                services = services.filter(id__in=service_ids)
             
-            print(f"DEBUG AVAILABILITY: Found {existing_appointments.count()} existing appointments")
-            for appt in existing_appointments:
-                print(f"DEBUG AVAILABILITY: Existing appointment: {appt.service.name} - {appt.start_time} to {appt.end_time}")
+            services = list(services)
+            print(f"DEBUG AVAILABILITY: Calculating availability for {len(services)} services of provider {provider_id}")
             
-            # Buffer time in minutes to add to both sides of appointments
-            buffer_minutes = BUFFER_MINUTES
+            # Slots starting within the next hour can no longer be booked
+            min_start = earliest_bookable_start()
             
-            # Create buffered time blocks for existing appointments
-            blocked_periods = []
-            for appointment in existing_appointments:
-                # Add buffer before and after the appointment
-                buffered_start = appointment.start_time - timezone.timedelta(minutes=buffer_minutes)
-                buffered_end = appointment.end_time + timezone.timedelta(minutes=buffer_minutes)
-                
-                blocked_periods.append({
-                    'start': buffered_start,
-                    'end': buffered_end,
-                    'original_appointment': appointment
-                })
-                print(f"DEBUG AVAILABILITY: Blocked period: {buffered_start} to {buffered_end} (from appointment {appointment.id})")
+            # The first bookable slot of each service, not the clock, tells whether the cutoff
+            # has dropped anything since the client's copy; one query on the materialized slots
+            # finds them, so a 304 is answered before any slot is computed
+            first_starts = first_materialized_starts(services, dates, min_start)
+            etag = make_etag(
+                'provider-availability', provider.id, provider.availability_version, dates[0], len(dates),
+                [(service.id, first_starts[service.id]) for service in services]
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
+            # The provider's appointments and availability blocks are loaded once for all services;
+            # slots are laid out from the block starts and filtered afterwards, as on the other
+            # availability endpoints, so today's slots keep the same times and ids everywhere
+            slots_by_service = {
+                service_id: slots_starting_from(slots_by_date, min_start)
+                for service_id, slots_by_date in compute_services_slots(provider, services, dates).items()
+            }
             
-            # Get provider's availabilities
-            availabilities = ProviderAvailability.objects.filter(provider=provider)
-            print(f"DEBUG AVAILABILITY: Found {availabilities.count()} availability blocks")
+            response = Response({
+                'provider': {
+                    'id': provider.id,
+                    'business_name': provider.business_name
+                },
+                'services': [
+                    {
+                        'id': service.id,
+                        'name': service.name,
+                        'duration': service.duration,
+                        'price': float(service.price),
+                        'availability': serialize_slots(slots_by_service[service.id])
+                    }
+                    for service in services
+                ]
+            })
+            response['ETag'] = etag
+            return response
+        except ServiceProvider.DoesNotExist:
+            return Response({
+                'error': 'Provider not found'
+            }, http_status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            import traceback
+            print(f"DEBUG AVAILABILITY ERROR: {str(e)}")
+            traceback.print_exc()
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class AvailabilityCacheStatsAPI(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Get the hit/miss counters of the availability caches of the process serving the request.
+
+        Counters are per process, so each worker reports its own traffic. The
+        discount quote cache also reports its size.
+        """
+        return Response(dict(get_cache_stats(), discount_quotes=get_quote_stats()))
+
+class AvailabilitySearchAPI(APIView):
+    permission_classes = [AllowAny]  # Allow anyone to search availability
+
+    def get(self, request):
+        """Find the earliest (or cheapest) bookable slots for a category near a location"""
+        try:
+            from .models import SERVICE_CATEGORIES
             
-            # Organize availability by date
-            date_availability = {}
+            category = request.query_params.get('category')
+            if category not in [value for value, label in SERVICE_CATEGORIES]:
+                return Response({
+                    'error': 'A valid category is required'
+                }, http_status.HTTP_400_BAD_REQUEST)
             
-            # Show 14 days of availability starting from today
-            for i in range(14):
-                curr_date = timezone.now().date() + timezone.timedelta(days=i)
-                date_str = curr_date.strftime('%Y-%m-%d')
-                date_availability[date_str] = []
+            sort = request.query_params.get('sort', 'earliest')
+            if sort not in ['earliest', 'cheapest']:
+                return Response({
+                    'error': 'sort must be either earliest or cheapest'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            
+            # Use the given coordinates, falling back to the consumer's saved location
+            latitude = request.query_params.get('latitude')
+            longitude = request.query_params.get('longitude')
+            try:
+                if latitude is not None and longitude is not None:
+                    location = Point(float(longitude), float(latitude), srid=4326)
+                elif request.user.is_authenticated and request.user.location:
+                    location = request.user.location
+                else:
+                    return Response({
+                        'error': 'latitude and longitude are required'
+                    }, http_status.HTTP_400_BAD_REQUEST)
                 
-                # Get availability records that match this specific date
-                matching_avail = [avail for avail in availabilities if avail.day_of_week == date_str]
+                limit = int(request.query_params.get('limit', 10))
                 
-                if not matching_avail:
-                    # If no explicit date match, continue to next date
-                    continue
+                # Slots starting within the next hour can no longer be booked
+                min_start = timezone.now() + timezone.timedelta(hours=1)
+                start = request.query_params.get('start')
+                if start:
+                    start_dt = parse_datetime(start)
+                    if timezone.is_naive(start_dt):
+                        start_dt = timezone.make_aware(start_dt)
+                    min_start = max(min_start, start_dt)
                 
-                for avail in matching_avail:
-                    # Create available time blocks
-                    start_time = avail.start_time
-                    end_time = avail.end_time
-                    
-                    # For current day, adjust start_time if it's in the past or within the buffer period
-                    if i == 0:  # Today
-                        # Calculate minimum start time (now + 1 hour)
-                        now_plus_hour = timezone.now() + timezone.timedelta(hours=1)
-                        min_time = now_plus_hour.time()
-                        
-                        # Make sure we're comparing time objects to time objects
-                        start_time_value = start_time
-                        if isinstance(start_time, datetime.datetime):
-                            start_time_value = start_time.time()
-                        
-                        # If availability starts before the minimum time, adjust it
-                        if start_time_value < min_time:
-                            print(f"DEBUG AVAILABILITY: Adjusting today's availability from {start_time} to {min_time}")
-                            # Convert min_time (a time object) to a datetime object with the same date as end_time
-                            if isinstance(start_time, datetime.datetime) and isinstance(min_time, datetime.time):
-                                min_datetime = datetime.datetime.combine(
-                                    start_time.date(),
-                                    min_time,
-                                    tzinfo=timezone.get_current_timezone()
-                                )
-                                start_time = min_datetime
-                            else:
-                                start_time = min_time
-                        
-                        # If the entire availability block is now invalid, skip it
-                        # Ensure both are the same type before comparison
-                        if isinstance(start_time, datetime.time) and isinstance(end_time, datetime.datetime):
-                            # Convert start_time to datetime for comparison
-                            start_datetime = datetime.datetime.combine(
-                                end_time.date(),
-                                start_time,
-                                tzinfo=timezone.get_current_timezone()
-                            )
-                            if start_datetime >= end_time:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                        elif isinstance(start_time, datetime.datetime) and isinstance(end_time, datetime.time):
-                            # Convert end_time to datetime for comparison
-                            end_datetime = datetime.datetime.combine(
-                                start_time.date(),
-                                end_time,
-                                tzinfo=timezone.get_current_timezone()
-                            )
-                            if start_time >= end_datetime:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                        else:
-                            # Both are the same type, can compare directly
-                            if start_time >= end_time:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                    
-                    # Calculate how many service slots fit in this availability block
-                    duration_minutes = service.duration
-                    
-                    # Calculate total block minutes available
-                    block_minutes = (end_time - start_time).total_seconds() / 60
-                    print(f"DEBUG AVAILABILITY: Block {date_str} from {start_time} to {end_time} ({block_minutes} minutes)")
-                    
-                    # Calculate slots using service duration
-                    available_slots = []
-                    current_start = start_time
-                    slot_index = 0
-                    
-                    # Loop until we can't fit another appointment
-                    while True:
-                        # Calculate end time for this slot
-                        current_end = current_start + timezone.timedelta(minutes=duration_minutes)
-                        
-                        # If this slot would exceed the availability block, break
-                        if current_end > end_time:
-                            break
-                        
-                        # Create a slot
-                        slot = {
-                            'id': f"slot-{date_str}-{slot_index}",
-                            'start': current_start,
-                            'end': current_end,
-                            'duration': duration_minutes
-                        }
-                        
-                        # Check if slot overlaps with ANY buffered appointment block
-                        is_available = True
-                        for blocked in blocked_periods:
-                            # Only check same day blocked periods
-                            block_date = blocked['start'].strftime('%Y-%m-%d')
-                            slot_date = current_start.strftime('%Y-%m-%d')
-                            if block_date != slot_date:
-                                continue
-                                
-                            # Check if this slot overlaps with the blocked period
-                            # (slot starts before blocked period ends AND slot ends after blocked period starts)
-                            if slot['start'] < blocked['end'] and slot['end'] > blocked['start']:
-                                print(f"DEBUG AVAILABILITY: Slot {slot['id']} at {slot['start']} conflicts with appointment {blocked['original_appointment'].id} " + 
-                                      f"({blocked['original_appointment'].service.name}) at {blocked['original_appointment'].start_time} - {blocked['original_appointment'].end_time} " +
-                                      f"[buffered: {blocked['start']} - {blocked['end']}]")
-                                is_available = False
-                                break
-                        
-                        if is_available:
-                            available_slots.append(slot)
-                            print(f"DEBUG AVAILABILITY: Added available slot: {slot['id']} at {slot['start']}")
-                        
-                        # Move to the next potential slot - add duration PLUS buffer time for spacing between slots
-                        # This ensures each appointment has buffer time on both sides
-                        slot_index += 1
-                        current_start = current_start + timezone.timedelta(minutes=duration_minutes + BUFFER_MINUTES)
-                    
-                    # Add valid slots to the output for this date
-                    for slot in available_slots:
-                        date_availability[date_str].append({
-                            'id': slot['id'],
-                            'start': slot['start'].isoformat(),
-                            'end': slot['end'].isoformat()
-                        })
-            
-            return Response(date_availability)
+                max_start = min_start + timezone.timedelta(days=AVAILABILITY_DAYS)
+                end = request.query_params.get('end')
+                if end:
+                    end_dt = parse_datetime(end)
+                    if timezone.is_naive(end_dt):
+                        end_dt = timezone.make_aware(end_dt)
+                    max_start = min(max_start, end_dt)
+            except (TypeError, ValueError, OverflowError):
+                return Response({
+                    'error': 'Invalid latitude, longitude, limit, start or end'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            
+            if max_start < min_start:
+                return Response([])
+            
+            dates = availability_dates(
+                (max_start.date() - min_start.date()).days + 1,
+                min_start.date()
+            )
+            
+            results = search_slots(category, location, dates, min_start, max_start, sort, limit)
+            return Response(results)
+        except Exception as e:
+            import traceback
+            print(f"DEBUG SEARCH ERROR: {str(e)}")
+            traceback.print_exc()
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServiceAvailabilityAPI(APIView):
+    permission_classes = [AllowAny]  # Allow anyone to view availability
+
+    def get(self, request, service_id):
+        """Get availability for a specific service with accurate conflict detection"""
+        try:
+            # Add debug logging
+            print(f"DEBUG AVAILABILITY: Reading availability for service {service_id}")
+            
+            from .models import Service
+            # Check if service exists
+            service = Service.objects.select_related('provider').get(id=service_id)
+            
+            # Requested horizon, e.g. ?start=2025-06-01&days=7 (capped server side)
+            try:
+                dates = parse_horizon(request.query_params)
+            except ValueError:
+                return Response({
+                    'error': 'start must be a YYYY-MM-DD date and days a positive number'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            
+            # Slots starting within the next hour can no longer be booked
+            min_start = earliest_bookable_start()
+            
+            if wants_stream(request):
+                # The payload depends on the provider's data version, the window and the first slot
+                # the cutoff has left, which one indexed query finds before any day is read
+                etag = make_etag(
+                    'availability-stream', service.id, service.provider.availability_version,
+                    dates[0], len(dates), first_materialized_start(service, dates, min_start)
+                )
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+                
+                # Send each day as soon as it has been read instead of building the whole payload
+                def days():
+                    for date in dates:
+                        day_availability = drop_slots_before(read_service_slots(service, [date]), min_start)
+                        yield from day_availability.items()
+                response = stream_days(days())
+                response['ETag'] = etag
+                return response
+            
+            # The provider version changes whenever a booking, availability block, service
+            # or discount config of this provider is saved, so cached payloads never go stale
+            provider_version = service.provider.availability_version
+            date_availability = get_cached_availability(service.id, provider_version, dates[0], len(dates))
+            cache_status = 'hit'
+            
+            if date_availability is None:
+                cache_status = 'miss'
+                # Free slots are kept up to date by the appointment and availability signals,
+                # so reading them is a range query on the materialized slot table
+                date_availability = read_service_slots(service, dates)
+                set_cached_availability(service.id, provider_version, dates[0], len(dates), date_availability)
+            
+            date_availability = drop_slots_before(date_availability, min_start)
+            
+            # Versioned by the first bookable slot rather than the clock, so polling clients
+            # keep getting 304s until a booking or the cutoff actually changes the slots
+            etag = make_etag(
+                'availability', service.id, provider_version, dates[0], len(dates),
+                first_slot_start(date_availability)
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
+            response = Response(date_availability)
+            response['X-Availability-Cache'] = cache_status
+            response['ETag'] = etag
+            return response
         except Service.DoesNotExist:
             return Response({
                 'error': 'Service not found'
@@ -1263,6 +1538,7 @@ class ServiceAvailabilityAPI(APIView):
 
 class ServiceAvailabilityWithDiscountAPI(APIView):
     permission_classes = [AllowAny]  # Allow anyone to view availability
+    content_negotiation_class = CompactFormatNegotiation  # ?format=compact is a payload layout, not a renderer
 
     def get(self, request, service_id):
         """Get availability for a specific service with discount calculations applied"""
@@ -1270,19 +1546,20 @@ class ServiceAvailabilityWithDiscountAPI(APIView):
             # Add debug logging
             print(f"DEBUG AVAILABILITY: Calculating availability with discounts for service {service_id}")
             
-            from .models import Service, ProviderAvailability, Appointment, ProximityDiscountConfig, User
-            from django.contrib.gis.db.models.functions import Distance
-            from django.contrib.gis.measure import D
+            from .models import Service, ProximityDiscountConfig
             
-            # Check if service exists
-            service = Service.objects.get(id=service_id)
+            # Service, provider and discount config in one joined query
+            service = Service.objects.select_related('provider', 'provider__discount_config').get(id=service_id)
             
             # Get provider associated with this service
             provider = service.provider
             print(f"DEBUG DISCOUNT: Found provider: {provider.business_name}")
             
             # Get the provider's discount configuration
-            discount_config = ProximityDiscountConfig.objects.filter(provider=provider).first()
+            try:
+                discount_config = provider.discount_config
+            except ProximityDiscountConfig.DoesNotExist:
+                discount_config = None
             
             # Log the discount configuration
             if discount_config:
@@ -1296,42 +1573,23 @@ class ServiceAvailabilityWithDiscountAPI(APIView):
             discounts_enabled = discount_config and discount_config.is_active
             print(f"DEBUG DISCOUNT: Discounts enabled: {discounts_enabled}")
             
-            # Get existing appointments for this provider (not just this service)
-            existing_appointments = Appointment.objects.filter(
-                service__provider=provider,  # All provider appointments
-                status__in=['pending', 'confirmed']  # Only active appointments
-            )
-            
-            print(f"DEBUG DISCOUNT: Found {existing_appointments.count()} existing appointments")
-            
             # Buffer time in minutes to add to both sides of appointments
             buffer_minutes = BUFFER_MINUTES
             
-            # Create buffered time blocks for existing appointments
-            blocked_periods = []
-            for appointment in existing_appointments:
-                # Add buffer before and after the appointment
-                buffered_start = appointment.start_time - timezone.timedelta(minutes=buffer_minutes)
-                buffered_end = appointment.end_time + timezone.timedelta(minutes=buffer_minutes)
-                
-                blocked_periods.append({
-                    'start': buffered_start,
-                    'end': buffered_end,
-                    'original_appointment': appointment
-                })
-            
-            # Get provider's availabilities
-            availabilities = ProviderAvailability.objects.filter(provider=provider)
+            # Requested horizon, e.g. ?start=2025-06-01&days=7 (capped server side)
+            try:
+                dates = parse_horizon(request.query_params)
+            except ValueError:
+                return Response({
+                    'error': 'start must be a YYYY-MM-DD date and days a positive number'
+                }, http_status.HTTP_400_BAD_REQUEST)
             
             # Get consumer's location from user profile if authenticated
             consumer_location = None
             if request.user.is_authenticated:
-                try:
-                    user = User.objects.get(id=request.user.id)
-                    consumer_location = user.location
-                    print(f"DEBUG DISCOUNT: Consumer location found: {consumer_location is not None}")
-                except Exception as e:
-                    print(f"DEBUG DISCOUNT: Error getting consumer location: {str(e)}")
+                # The authenticated user is already loaded, no need to fetch it again
+                consumer_location = request.user.location
+                print(f"DEBUG DISCOUNT: Consumer location found: {consumer_location is not None}")
             
             # Log a warning if user doesn't have location data
             if request.user.is_authenticated and not consumer_location:
@@ -1340,7 +1598,7 @@ class ServiceAvailabilityWithDiscountAPI(APIView):
                 
                 # Try to geocode the address now if fields are available
                 try:
-                    user = User.objects.get(id=request.user.id)
+                    user = request.user
                     if user.street_address and user.city and user.state:
                         from .utils.geo_utils import get_location_from_address
                         
@@ -1362,228 +1620,97 @@ class ServiceAvailabilityWithDiscountAPI(APIView):
                             user.location = location
                             user.latitude = location.y
                             user.longitude = location.x
-                            user.save()
+                            user.save(update_fields=['location', 'latitude', 'longitude'])
                             consumer_location = location
                             print(f"DEBUG GEOCODING: Updated user record with new location")
                 except Exception as e:
                     print(f"DEBUG DISCOUNT: Real-time geocoding failed: {str(e)}")
             
-            # Organize availability by date
-            date_availability = {}
+            # Slots starting within the next hour can no longer be booked
+            min_start = earliest_bookable_start()
             
-            # Show 14 days of availability starting from today
-            for i in range(14):
-                curr_date = timezone.now().date() + timezone.timedelta(days=i)
-                date_str = curr_date.strftime('%Y-%m-%d')
-                date_availability[date_str] = []
-                
-                # Get availability records that match this specific date
-                matching_avail = [avail for avail in availabilities if avail.day_of_week == date_str]
-                
-                if not matching_avail:
-                    # If no explicit date match, continue to next date
-                    continue
+            # Free slots at the service price do not depend on the consumer, so they are
+            # cached per provider version (and warmed by the precompute_availability command)
+            slots_by_date = get_cached_base_prices(service.id, provider.availability_version, dates[0], len(dates))
+            if slots_by_date is not None:
+                slots_by_date = slots_starting_from(slots_by_date, min_start)
+                first_start = first_slot_start(slots_by_date)
+            else:
+                # On a miss the first bookable slot comes from the materialized slots,
+                # so nothing is computed for a client that already has the payload
+                first_start = first_materialized_start(service, dates, min_start)
+            
+            # Discounts depend on the provider's data (its version also covers the discount config)
+            # and on the consumer's quote cell; the first bookable slot stands in for the clock,
+            # and the quote expiry window makes clients fetch fresh quote tokens before theirs expire
+            consumer_cell = location_cell(consumer_location) if consumer_location else None
+            expires_at = quote_expiry()
+            etag = make_etag(
+                'availability-with-discount', service.id, provider.availability_version,
+                dates[0], len(dates), first_start, consumer_cell, expires_at,
+                wants_stream(request), wants_compact(request.query_params)
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
+            if slots_by_date is None:
+                blocks_by_date, busy = load_provider_schedule(provider, dates)
+                slots_by_date = compute_base_prices(service, blocks_by_date, busy)
+                set_cached_base_prices(service.id, provider.availability_version, dates[0], len(dates), slots_by_date)
+                slots_by_date = slots_starting_from(slots_by_date, min_start)
+            
+            if discounts_enabled and consumer_location:
+                def load_pricing():
+                    # Appointments adjacent in time to any slot can earn it a discount
+                    slot_times = [slot for day_slots in slots_by_date.values() for slot in day_slots]
+                    adjacency = datetime.timedelta(minutes=TIME_ADJACENCY_MINUTES)
+                    window = None
+                    if slot_times:
+                        window = (
+                            min(slot['start'] for slot in slot_times) - adjacency,
+                            max(slot['end'] for slot in slot_times) + adjacency
+                        )
+                    # Only appointments within the largest tier distance can earn a discount, PostGIS
+                    # finds and measures them once so slots only test time adjacency
+                    nearby_appointments = list(load_nearby_window_appointments(
+                        provider, DISCOUNT_STATUSES, window, consumer_location, discount_config.tier4_max_distance
+                    ))
+                    print(f"DEBUG DISCOUNT: Found {len(nearby_appointments)} nearby appointments")
+                    return NearbyDiscountPricing(nearby_appointments, discount_config)
                 
-                for avail in matching_avail:
-                    # Create available time blocks
-                    start_time = avail.start_time
-                    end_time = avail.end_time
-                    
-                    # For current day, adjust start_time if it's in the past or within the buffer period
-                    if i == 0:  # Today
-                        # Calculate minimum start time (now + 1 hour)
-                        now_plus_hour = timezone.now() + timezone.timedelta(hours=1)
-                        min_time = now_plus_hour.time()
-                        
-                        # Make sure we're comparing time objects to time objects
-                        start_time_value = start_time
-                        if isinstance(start_time, datetime.datetime):
-                            start_time_value = start_time.time()
-                        
-                        # If availability starts before the minimum time, adjust it
-                        if start_time_value < min_time:
-                            print(f"DEBUG AVAILABILITY: Adjusting today's availability from {start_time} to {min_time}")
-                            # Convert min_time (a time object) to a datetime object with the same date as end_time
-                            if isinstance(start_time, datetime.datetime) and isinstance(min_time, datetime.time):
-                                min_datetime = datetime.datetime.combine(
-                                    start_time.date(),
-                                    min_time,
-                                    tzinfo=timezone.get_current_timezone()
-                                )
-                                start_time = min_datetime
-                            else:
-                                start_time = min_time
-                        
-                        # If the entire availability block is now invalid, skip it
-                        # Ensure both are the same type before comparison
-                        if isinstance(start_time, datetime.time) and isinstance(end_time, datetime.datetime):
-                            # Convert start_time to datetime for comparison
-                            start_datetime = datetime.datetime.combine(
-                                end_time.date(),
-                                start_time,
-                                tzinfo=timezone.get_current_timezone()
-                            )
-                            if start_datetime >= end_time:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                        elif isinstance(start_time, datetime.datetime) and isinstance(end_time, datetime.time):
-                            # Convert end_time to datetime for comparison
-                            end_datetime = datetime.datetime.combine(
-                                start_time.date(),
-                                end_time,
-                                tzinfo=timezone.get_current_timezone()
-                            )
-                            if start_time >= end_datetime:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                        else:
-                            # Both are the same type, can compare directly
-                            if start_time >= end_time:
-                                print(f"DEBUG AVAILABILITY: Skipping availability block - no valid time left today")
-                                continue
-                    
-                    # Calculate how many service slots fit in this availability block
-                    duration_minutes = service.duration
-                    
-                    # Calculate total block minutes available
-                    block_minutes = (end_time - start_time).total_seconds() / 60
-                    
-                    # Calculate slots using service duration
-                    available_slots = []
-                    current_start = start_time
-                    slot_index = 0
-                    
-                    # Loop until we can't fit another appointment
-                    while True:
-                        # Calculate end time for this slot
-                        current_end = current_start + timezone.timedelta(minutes=duration_minutes)
-                        
-                        # If this slot would exceed the availability block, break
-                        if current_end > end_time:
-                            break
-                        
-                        # Create a slot
-                        slot = {
-                            'id': f"slot-{date_str}-{slot_index}",
-                            'start': current_start,
-                            'end': current_end,
-                            'duration': duration_minutes,
-                            'original_price': float(service.price),
-                            'discount_percentage': 0,
-                            # Include buffer information so the frontend knows about buffer zones
-                            'buffer_info': {
-                                'buffer_minutes': buffer_minutes,
-                                'buffered_start': (current_start - timezone.timedelta(minutes=buffer_minutes)).isoformat(),
-                                'buffered_end': (current_end + timezone.timedelta(minutes=buffer_minutes)).isoformat(),
-                                'has_buffer': True
-                            },
-                            'discounted_price': float(service.price)
-                        }
-                        
-                        # Check if slot overlaps with ANY buffered appointment block
-                        is_available = True
-                        for blocked in blocked_periods:
-                            # Only check same day blocked periods
-                            block_date = blocked['start'].strftime('%Y-%m-%d')
-                            slot_date = current_start.strftime('%Y-%m-%d')
-                            if block_date != slot_date:
-                                continue
-                                
-                            # Check if this slot overlaps with the blocked period
-                            # (slot starts before blocked period ends AND slot ends after blocked period starts)
-                            if slot['start'] < blocked['end'] and slot['end'] > blocked['start']:
-                                is_available = False
-                                break
-                        
-                        # If the slot is available and discounts are enabled, calculate any applicable discount
-                        if is_available and discounts_enabled and consumer_location:
-                            # First filter for time-adjacent appointments (immediately before or after this slot)
-                            # Define what "adjacent" means in minutes
-                            time_adjacency_threshold_minutes = 60  # Consider appointments within 1 hour to be adjacent
-                            
-                            # Convert time adjacency to timedelta
-                            time_adjacency_threshold = timezone.timedelta(minutes=time_adjacency_threshold_minutes)
-                            
-                            # Filter for appointments that are close in time to this slot
-                            time_adjacent_appointments = []
-                            for appt in existing_appointments:
-                                # Check if appointment ends shortly before this slot begins
-                                if slot['start'] - time_adjacency_threshold <= appt.end_time <= slot['start']:
-                                    time_adjacent_appointments.append(appt)
-                                
-                                # Check if appointment begins shortly after this slot ends
-                                elif slot['end'] <= appt.start_time <= slot['end'] + time_adjacency_threshold:
-                                    time_adjacent_appointments.append(appt)
-                            
-                            # Only proceed if we have time-adjacent appointments
-                            if time_adjacent_appointments:
-                                # Now filter for appointments that are also geographically close
-                                nearby_appointments = []
-                                
-                                # Find nearby appointments within maximum tier distance
-                                max_distance = discount_config.tier4_max_distance  # Use the largest tier distance
-                                
-                                for appt in time_adjacent_appointments:
-                                    # Skip if appointment has no location
-                                    if not appt.location or not consumer_location:
-                                        continue
-                                        
-                                    # Calculate distance between consumer and appointment location in yards
-                                    # PostGIS uses meters for geography calculations
-                                    try:
-                                        distance_m = consumer_location.distance(appt.location) * 100000  # Convert to meters
-                                        distance_yards = distance_m * 1.09361  # Convert meters to yards
-                                        
-                                        if distance_yards <= max_distance:
-                                            nearby_appointments.append({
-                                                'appointment': appt,
-                                                'distance_yards': distance_yards
-                                            })
-                                    except Exception as e:
-                                        continue
-                                
-                                # Sort by distance (closest first)
-                                nearby_appointments.sort(key=lambda x: x['distance_yards'])
-                                
-                                # If we have nearby and time-adjacent appointments, calculate a discount
-                                if nearby_appointments:
-                                    # Get the closest appointment's distance
-                                    closest_distance = nearby_appointments[0]['distance_yards']
-                                    appt_count = min(len(nearby_appointments), 5)  # Cap at 5 for discount tiers
-                                    
-                                    # Calculate discount based on distance and appointment count
-                                    discount_percentage = discount_config.get_discount_for_distance_and_count(
-                                        closest_distance, appt_count
-                                    )
-                                    
-                                    if discount_percentage > 0:
-                                        slot['discount_percentage'] = discount_percentage
-                                        slot['discounted_price'] = round(slot['original_price'] * (1 - discount_percentage / 100), 2)
-                        
-                        if is_available:
-                            available_slots.append(slot)
-                        
-                        # Move to the next potential slot - add duration PLUS buffer time for spacing between slots
-                        # This ensures each appointment has buffer time on both sides
-                        slot_index += 1
-                        current_start = current_start + timezone.timedelta(minutes=duration_minutes + BUFFER_MINUTES)
-                    
-                    # Add available slots to the time block for this date
-                    for slot in available_slots:
-                        # Create new slot for the API response
-                        new_slot = {
-                            'id': slot['id'],
-                            'start': slot['start'].isoformat(),
-                            'end': slot['end'].isoformat(),
-                            'duration': slot['duration'],
-                            'original_price': slot['original_price'],
-                            'discount_percentage': slot['discount_percentage'],
-                            'discounted_price': slot['discounted_price'],
-                            'buffer_info': slot['buffer_info']
-                        }
-                        date_availability[date_str].append(new_slot)
+                # Consumers in the same ~50 m cell get the same discounts, so quotes are cached
+                # per provider-day and cell and the proximity stage only runs on a miss
+                pricing = CachedDiscountPricing(
+                    provider.id, provider.availability_version, consumer_cell, load_pricing
+                )
+                days = price_slots(service, slots_by_date, pricing)
+            else:
+                days = slots_by_date.items()
+            
+            # Each slot carries its price signed for the consumer's cell, so booking it does not
+            # recompute the discount
+            days = attach_quote_tokens(days, service.id, provider.availability_version, expires_at, consumer_cell)
+            
+            if wants_compact(request.query_params):
+                # Columnar payload: shared fields once, per-day arrays of start offsets and discounts
+                origin = datetime.datetime.combine(dates[0], datetime.time(), tzinfo=datetime.timezone.utc)
+                response = Response(compact_availability(days, origin, service.duration, service.price, buffer_minutes))
+                response['ETag'] = etag
+                return response
+            
+            full_days = (
+                (date_str, [serialize_priced_slot(slot, buffer_minutes) for slot in day_slots])
+                for date_str, day_slots in days
+            )
             
-            return Response(date_availability)
+            if wants_stream(request):
+                response = stream_days(full_days)
+            else:
+                # Organize availability by date
+                response = Response(dict(full_days))
+            
+            response['ETag'] = etag
+            return response
         
         except Exception as e:
             print(f"ERROR in ServiceAvailabilityWithDiscountAPI: {str(e)}")
@@ -1594,6 +1721,101 @@ class ServiceAvailabilityWithDiscountAPI(APIView):
                 status=http_status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class ServiceDiscountQuotesAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, service_id):
+        """
+        Quote the best discounted slot of a service for many consumer locations at once.
+
+        Body: {"points": [{"id": ..., "latitude": ..., "longitude": ...}], "start": "YYYY-MM-DD", "days": N}
+        The quotes are offers only; booking a slot still prices it for the booking consumer.
+        """
+        try:
+            service = Service.objects.select_related('provider', 'provider__discount_config').get(id=service_id)
+            # Batch quotes map out where the provider's bookings are, as the discount tiles do
+            if not can_map_discounts(request.user, service.provider):
+                return Response({
+                    'error': 'You do not have permission to quote this service'
+                }, http_status.HTTP_403_FORBIDDEN)
+
+            if not isinstance(request.data, dict):
+                return Response({
+                    'error': 'The request body must be a JSON object'
+                }, http_status.HTTP_400_BAD_REQUEST)
+
+            try:
+                discount_config = service.provider.discount_config
+            except ProximityDiscountConfig.DoesNotExist:
+                discount_config = None
+
+            try:
+                dates = parse_horizon(request.data)
+            except (ValueError, TypeError):
+                return Response({
+                    'error': 'start must be a YYYY-MM-DD date and days a positive number'
+                }, http_status.HTTP_400_BAD_REQUEST)
+
+            points = request.data.get('points')
+            if not isinstance(points, list) or not points:
+                return Response({
+                    'error': 'points must be a non-empty list of {latitude, longitude} objects'
+                }, http_status.HTTP_400_BAD_REQUEST)
+            if len(points) > MAX_BATCH_POINTS:
+                return Response({
+                    'error': f'At most {MAX_BATCH_POINTS} points can be quoted in one request'
+                }, http_status.HTTP_400_BAD_REQUEST)
+
+            locations = []
+            for point in points:
+                try:
+                    latitude = float(point['latitude'])
+                    longitude = float(point['longitude'])
+                except (KeyError, TypeError, ValueError):
+                    return Response({
+                        'error': 'Every point needs a numeric latitude and longitude'
+                    }, http_status.HTTP_400_BAD_REQUEST)
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    return Response({
+                        'error': 'Point coordinates are out of range'
+                    }, http_status.HTTP_400_BAD_REQUEST)
+                locations.append((latitude, longitude))
+
+            print(f"DEBUG DISCOUNT: Quoting {len(locations)} locations for service {service_id}")
+
+            # Slots starting within the next hour can no longer be booked
+            quotes = quote_locations(service, discount_config, locations, dates, earliest_bookable_start())
+
+            return Response({
+                'service': {
+                    'id': service.id,
+                    'name': service.name,
+                    'duration': service.duration,
+                    'price': float(service.price)
+                },
+                'quotes': [
+                    {
+                        'id': point.get('id', position),
+                        'latitude': latitude,
+                        'longitude': longitude,
+                        'discount_percentage': quote['discount_percentage'],
+                        'slot': serialize_priced_slot(quote['slot']) if quote['slot'] else None
+                    }
+                    for position, (point, (latitude, longitude), quote) in enumerate(zip(points, locations, quotes))
+                ]
+            })
+        except Service.DoesNotExist:
+            return Response({
+                'error': 'Service not found'
+            }, http_status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            import traceback
+            print(f"ERROR in ServiceDiscountQuotesAPI: {str(e)}")
+            traceback.print_exc()
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class AppointmentListAPI(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -1683,8 +1905,8 @@ class AppointmentListAPI(APIView):
             zip_code = request.data.get('zip_code', '')
             country = request.data.get('country', 'United States')
             
-            # Get service
-            service = Service.objects.get(id=service_id)
+            # Get service, with the provider and discount config pricing needs
+            service = Service.objects.select_related('provider', 'provider__discount_config').get(id=service_id)
             
             # Convert string times to datetime objects
             start_dt = parse_datetime(start_time) if isinstance(start_time, str) else start_time
@@ -1712,54 +1934,17 @@ class AppointmentListAPI(APIView):
             print(f"DEBUG APPOINTMENT: Checking conflicts for time range {start_dt} to {end_dt}")
             print(f"DEBUG APPOINTMENT: With buffer: {buffered_start} to {buffered_end}")
             
-            # Check for overlapping appointments
-            overlapping_appointments = Appointment.objects.filter(
-                service__provider=service.provider,
-                status__in=['pending', 'confirmed', 'completed'],
-            ).exclude(status='cancelled')
+            buffer = timezone.timedelta(minutes=buffer_minutes)
             
-            print(f"DEBUG APPOINTMENT: Found {overlapping_appointments.count()} potential conflicts")
-            print(f"DEBUG APPOINTMENT: Requested booking time: {start_dt} to {end_dt}")
-            print(f"DEBUG APPOINTMENT: With buffer applied: {buffered_start} to {buffered_end}")
+            def find_conflicts():
+                return list(Appointment.objects.filter(
+                    service__provider_id=service.provider_id,
+                    status__in=BLOCKING_STATUSES,
+                    start_time__lt=end_dt + buffer,
+                    end_time__gt=start_dt - buffer
+                ).select_related('service').order_by('start_time'))
             
-            conflicts = []
-            for appt in overlapping_appointments:
-                appt_buffered_start = appt.start_time - timezone.timedelta(minutes=buffer_minutes)
-                appt_buffered_end = appt.end_time + timezone.timedelta(minutes=buffer_minutes)
-                
-                print(f"DEBUG APPOINTMENT: Checking against appointment {appt.id}:")
-                print(f"  - Original time: {appt.start_time} to {appt.end_time}")
-                print(f"  - Buffered time: {appt_buffered_start} to {appt_buffered_end}")
-                
-                # Calculate if there's any overlap and explain why
-                has_overlap = (start_dt < appt_buffered_end and end_dt > appt_buffered_start)
-                
-                print(f"  - Comparison results:")
-                print(f"    - start_dt < appt_buffered_end: {start_dt} < {appt_buffered_end} = {start_dt < appt_buffered_end}")
-                print(f"    - end_dt > appt_buffered_start: {end_dt} > {appt_buffered_start} = {end_dt > appt_buffered_start}")
-                print(f"    - Overall overlap: {has_overlap}")
-                
-                # Check if there's any overlap
-                if has_overlap:
-                    conflicts.append(appt)
-                    print(f"DEBUG APPOINTMENT: Found conflict with appointment {appt.id}")
-                    
-                    # Calculate the exact overlap amount
-                    overlap_start = max(start_dt, appt_buffered_start)
-                    overlap_end = min(end_dt, appt_buffered_end)
-                    overlap_minutes = (overlap_end - overlap_start).total_seconds() / 60
-                    print(f"  - Overlap details: {overlap_start} to {overlap_end} ({overlap_minutes:.2f} minutes)")
-                else:
-                    print(f"DEBUG APPOINTMENT: No conflict with appointment {appt.id}")
-                    # Calculate the gap between appointments (if any)
-                    if start_dt >= appt_buffered_end:
-                        gap_minutes = (start_dt - appt_buffered_end).total_seconds() / 60
-                        print(f"  - Gap after existing appointment: {gap_minutes:.2f} minutes")
-                    elif end_dt <= appt_buffered_start:
-                        gap_minutes = (appt_buffered_start - end_dt).total_seconds() / 60
-                        print(f"  - Gap before existing appointment: {gap_minutes:.2f} minutes")
-            
-            if conflicts:
+            def conflict_response(conflicts):
                 conflict_details = []
                 for appt in conflicts:
                     conflict_details.append({
@@ -1775,6 +1960,44 @@ class AppointmentListAPI(APIView):
                     'conflict_appointments': conflict_details
                 }, http_status.HTTP_409_CONFLICT)
             
+            # The busy bitmaps are refreshed after commit and can lag behind, so they only reject
+            # early: a slot they report as busy is checked against the appointments right away,
+            # and every booking is checked again under the provider lock before it is saved
+            if buffer_minutes == BUFFER_MINUTES:
+                busy = load_busy_bitmaps(service.provider_id, span_dates(start_dt, end_dt))
+                if not busy.is_free(start_dt, end_dt):
+                    conflicts = find_conflicts()
+                    print(f"DEBUG APPOINTMENT: Found {len(conflicts)} conflicts")
+                    if conflicts:
+                        return conflict_response(conflicts)
+            
+            # Keep the price the consumer was quoted; the signed token is checked without
+            # recomputing anything, the discount is only recomputed when the quote is
+            # missing, expired or older than the provider's current data
+            quote = None
+            consumer_location = request.user.location if request.user.is_authenticated else None
+            quote_token = request.data.get('quote_token')
+            if quote_token:
+                try:
+                    quote = read_quote_token(
+                        quote_token, service.id, start_dt, service.provider.availability_version,
+                        location_cell(consumer_location) if consumer_location else None
+                    )
+                except InvalidQuoteToken as e:
+                    return Response({
+                        'error': str(e)
+                    }, http_status.HTTP_400_BAD_REQUEST)
+            
+            if quote is None:
+                print("DEBUG APPOINTMENT: No valid quote, repricing the slot")
+                try:
+                    discount_config = service.provider.discount_config
+                except ProximityDiscountConfig.DoesNotExist:
+                    discount_config = None
+                quote = reprice_slot(service, discount_config, consumer_location, start_dt, end_dt)
+            
+            original_price, discount_amount, final_price = booking_prices(quote)
+            
             # Create appointment
             appointment = Appointment(
                 service=service,
@@ -1790,6 +2013,10 @@ class AppointmentListAPI(APIView):
                 state=state,
                 zip_code=zip_code,
                 country=country,
+                original_price=original_price,
+                discount_amount=discount_amount,
+                final_price=final_price,
+                discount_reason='Proximity discount' if discount_amount > 0 else '',
                 id=uuid.uuid4()  # Explicitly set a UUID
             )
             
@@ -1829,8 +2056,17 @@ class AppointmentListAPI(APIView):
                     print(f"DEBUG APPOINTMENT: Error initializing geocoding: {str(e)}")
             
             # Save the appointment regardless of geocoding success
+            from django.db import transaction
             try:
-                appointment.save()
+                with transaction.atomic():
+                    # Bookings of the same provider serialize on its row, so two of them
+                    # cannot both find the slot free
+                    ServiceProvider.objects.select_for_update().filter(id=service.provider_id).exists()
+                    conflicts = find_conflicts()
+                    print(f"DEBUG APPOINTMENT: Found {len(conflicts)} conflicts")
+                    if conflicts:
+                        return conflict_response(conflicts)
+                    appointment.save()
                 print(f"DEBUG APPOINTMENT: Successfully created appointment {appointment.id}")
             except Exception as save_err:
                 print(f"DEBUG APPOINTMENT: Error saving appointment: {str(save_err)}")
@@ -1846,6 +2082,9 @@ class AppointmentListAPI(APIView):
                 'end_time': end_time,
                 'status': appointment.status,
                 'notes': appointment.notes,
+                'original_price': float(appointment.original_price),
+                'discount_amount': float(appointment.discount_amount),
+                'final_price': float(appointment.final_price),
                 'address_line1': appointment.address_line1,
                 'address_line2': appointment.address_line2,
                 'city': appointment.city,
@@ -2184,6 +2423,11 @@ class ProviderServiceListAPI(APIView):
                 is_active=True
             )
             
+            # Answer re-polls with 304 while none of the provider's services changed
+            etag = make_etag('provider-services', provider_id, *catalog_version(services))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
             # Serialize services
             service_list = []
             for service in services:
@@ -2201,7 +2445,9 @@ class ProviderServiceListAPI(APIView):
                     }
                 })
             
-            return Response(service_list)
+            response = Response(service_list)
+            response['ETag'] = etag
+            return response
         except Exception as e:
             print(f"Error in ProviderServiceListAPI: {str(e)}")
             return Response({
@@ -2412,6 +2658,9 @@ class ProximityDiscountConfigAPI(APIView):
             # Save the updated configuration
             config.save()
             
+            # Drop this process's compiled copy of the tiers, other processes see the new updated_at
+            invalidate_discount_table(provider.id)
+            
             # Return the updated configuration
             return self.get(request)
         
@@ -2421,6 +2670,72 @@ class ProximityDiscountConfigAPI(APIView):
                 'error': str(e)
             }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ProviderDiscountHeatmapAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, provider_id, date, z, x, y, tile_format):
+        """
+        Get a map tile of the discount tiers around a provider's appointments of a day.
+
+        PNG tiles color each tier (transparent where no discount applies),
+        GeoJSON tiles hold one MultiPolygon per tier with its distances and discounts.
+        """
+        try:
+            provider = ServiceProvider.objects.select_related('discount_config').get(id=provider_id)
+            if not can_map_discounts(request.user, provider):
+                return Response({
+                    'error': 'You do not have permission to view this discount map'
+                }, http_status.HTTP_403_FORBIDDEN)
+
+            if tile_format not in TILE_FORMATS:
+                return Response({
+                    'error': 'Tiles are available as png or geojson'
+                }, http_status.HTTP_404_NOT_FOUND)
+
+            if not valid_tile(z, x, y):
+                return Response({
+                    'error': 'Invalid tile coordinates'
+                }, http_status.HTTP_404_NOT_FOUND)
+
+            try:
+                date = datetime.date.fromisoformat(date)
+            except ValueError:
+                return Response({
+                    'error': 'date must be a YYYY-MM-DD date'
+                }, http_status.HTTP_400_BAD_REQUEST)
+
+            try:
+                discount_config = provider.discount_config
+            except ProximityDiscountConfig.DoesNotExist:
+                return Response({
+                    'error': 'Provider has no discount configuration'
+                }, http_status.HTTP_404_NOT_FOUND)
+
+            # The tile only changes with the provider's bookings and discount config
+            etag = make_etag('discount-tile', provider.id, provider.availability_version, date, z, x, y, tile_format)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            tile = discount_heatmap_tile(provider, discount_config, date, z, x, y, tile_format)
+
+            if tile_format == 'png':
+                response = HttpResponse(tile, content_type='image/png')
+            else:
+                response = Response(tile, content_type='application/geo+json')
+            response['ETag'] = etag
+            return response
+        except ServiceProvider.DoesNotExist:
+            return Response({
+                'error': 'Provider not found'
+            }, http_status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            import traceback
+            print(f"Error in ProviderDiscountHeatmapAPI: {str(e)}")
+            traceback.print_exc()
+            return Response({
+                'error': str(e)
+            }, http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # Regular views
 def index(request):
     return render(request, 'main_app/index.html')
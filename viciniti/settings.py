@@ -183,6 +183,13 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Discount quotes are cached per geohash cell of the consumer, 8 characters are cells of
+# about 38 x 19 m; fewer characters give larger cells and more hits, at the cost of accuracy
+DISCOUNT_QUOTE_GEOHASH_PRECISION = int(os.getenv('DISCOUNT_QUOTE_GEOHASH_PRECISION', '8'))
+
+# Number of (provider, day, cell) discount quotes each process keeps
+DISCOUNT_QUOTE_CACHE_SIZE = int(os.getenv('DISCOUNT_QUOTE_CACHE_SIZE', '10000'))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # In production, specify exact origins
 CORS_ALLOW_CREDENTIALS = True